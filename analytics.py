@@ -0,0 +1,144 @@
+"""
+Report analytics over columnar data: hour x weekday heatmaps, staff throughput and
+"often bought together" item pairs.
+
+app.py pulls each period with one query and passes plain columns (sequences of equal
+length) in; the functions here only compute. With NumPy installed the group-bys are
+vectorized (bincount / unique / a chunked item-incidence product); without it the
+same results come from plain Python loops, which is fine for small shops and tests.
+"""
+from collections import Counter, defaultdict
+from itertools import combinations
+
+try:
+    import numpy as np
+except ImportError:  # optional: see requirements.txt
+    np = None
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+_EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday (Mon = 0)
+_BASKET_CHUNK = 20000  # bills per block of the incidence matrix (rows x items float32)
+
+
+def _local_seconds(epoch_seconds, utc_offset_minutes):
+    return [t + utc_offset_minutes * 60 for t in epoch_seconds]
+
+
+def revenue_heatmap(epoch_seconds, amounts, utc_offset_minutes=0):
+    """
+    Revenue and bill count per (weekday, hour of day).
+    epoch_seconds: bill times as UTC Unix seconds; amounts: bill totals.
+    Returns {'weekdays', 'hours', 'revenue': 7x24, 'bills': 7x24}.
+    """
+    if np is not None:
+        t = np.asarray(epoch_seconds, dtype=np.int64) + utc_offset_minutes * 60
+        days, secs = np.divmod(t, 86400)
+        slot = ((days + _EPOCH_WEEKDAY) % 7) * 24 + secs // 3600
+        revenue = np.bincount(slot, weights=np.asarray(amounts, dtype=np.float64), minlength=168)
+        bills = np.bincount(slot, minlength=168)
+        revenue, bills = revenue.reshape(7, 24).round(2).tolist(), bills.reshape(7, 24).tolist()
+    else:
+        revenue = [[0.0] * 24 for _ in range(7)]
+        bills = [[0] * 24 for _ in range(7)]
+        for t, amount in zip(_local_seconds(epoch_seconds, utc_offset_minutes), amounts):
+            days, secs = divmod(int(t), 86400)
+            weekday, hour = (days + _EPOCH_WEEKDAY) % 7, secs // 3600
+            revenue[weekday][hour] += amount
+            bills[weekday][hour] += 1
+        revenue = [[round(v, 2) for v in row] for row in revenue]
+
+    return {'weekdays': WEEKDAYS, 'hours': list(range(24)), 'revenue': revenue, 'bills': bills}
+
+
+def staff_performance(user_ids, epoch_seconds, amounts):
+    """
+    Per staff member: bills, revenue, average ticket, active hours (distinct clock hours
+    with at least one bill) and bills per active hour, busiest first.
+    user_ids may contain None (bills without a cashier); they are reported as user_id None.
+    Returns [{'user_id', 'bills', 'revenue', 'avg_ticket', 'active_hours', 'bills_per_hour'}].
+    """
+    if np is not None and len(user_ids):
+        users = np.asarray([-1 if u is None else u for u in user_ids], dtype=np.int64)
+        hours = np.asarray(epoch_seconds, dtype=np.int64) // 3600
+        amounts = np.asarray(amounts, dtype=np.float64)
+
+        keys, index = np.unique(users, return_inverse=True)
+        bills = np.bincount(index)
+        revenue = np.bincount(index, weights=amounts)
+        # distinct (user, hour) slots, counted per user
+        slots = np.unique(index.astype(np.int64) * (hours.max() + 1) + hours)
+        active_hours = np.bincount(slots // (hours.max() + 1), minlength=len(keys))
+
+        stats = zip(keys.tolist(), bills.tolist(), revenue.tolist(), active_hours.tolist())
+        stats = [(None if k == -1 else k, b, r, h) for k, b, r, h in stats]
+    else:
+        bills, revenue, slots = Counter(), defaultdict(float), defaultdict(set)
+        for user_id, t, amount in zip(user_ids, epoch_seconds, amounts):
+            bills[user_id] += 1
+            revenue[user_id] += amount
+            slots[user_id].add(int(t) // 3600)
+        stats = [(u, bills[u], revenue[u], len(slots[u])) for u in bills]
+
+    return sorted(({
+        'user_id': user_id,
+        'bills': b,
+        'revenue': round(r, 2),
+        'avg_ticket': round(r / b, 2),
+        'active_hours': h,
+        'bills_per_hour': round(b / h, 2),
+    } for user_id, b, r, h in stats), key=lambda s: (-s['bills'], s['user_id'] or 0))
+
+
+def item_pairs(bill_ids, item_ids, min_count=3, limit=20):
+    """
+    "Often bought together": item pairs that share a bill, from (bill_id, item_id) line
+    columns. A bill counts once per pair however many units/lines it has.
+    Returns (bill count, [{'items': (a, b), 'bills', 'support', 'confidence', 'lift'}]),
+    pairs with at least min_count bills, most frequent first. confidence is the larger of
+    P(b | a) and P(a | b); lift > 1 means the pair sells together more than by chance.
+    """
+    if np is not None and len(bill_ids):
+        bills = np.asarray(bill_ids, dtype=np.int64)
+        items = np.asarray(item_ids, dtype=np.int64)
+        bill_keys, bill_index = np.unique(bills, return_inverse=True)
+        item_keys, item_index = np.unique(items, return_inverse=True)
+        n_bills, n_items = len(bill_keys), len(item_keys)
+
+        # Bill x item incidence (1 if the bill has the item) in blocks of bills; co-occurrence = B.T @ B
+        order = np.argsort(bill_index, kind='stable')
+        bill_index, item_index = bill_index[order], item_index[order]
+        together = np.zeros((n_items, n_items), dtype=np.float64)
+        for start in range(0, n_bills, _BASKET_CHUNK):
+            lo, hi = np.searchsorted(bill_index, [start, start + _BASKET_CHUNK])
+            block = np.zeros((min(_BASKET_CHUNK, n_bills - start), n_items), dtype=np.float32)
+            block[bill_index[lo:hi] - start, item_index[lo:hi]] = 1
+            together += block.T @ block
+
+        per_item = np.diag(together).copy()
+        a, b = np.triu_indices(n_items, k=1)
+        counts = together[a, b]
+        keep = counts >= min_count
+        a, b, counts = a[keep], b[keep], counts[keep]
+        top = np.lexsort((b, a, -counts))[:limit]
+        pairs = [(int(item_keys[a[i]]), int(item_keys[b[i]]), int(counts[i]),
+                  int(per_item[a[i]]), int(per_item[b[i]])) for i in top]
+    else:
+        baskets = defaultdict(set)
+        for bill_id, item_id in zip(bill_ids, item_ids):
+            baskets[bill_id].add(item_id)
+        n_bills = len(baskets)
+        per_item, together = Counter(), Counter()
+        for basket in baskets.values():
+            per_item.update(basket)
+            together.update(combinations(sorted(basket), 2))
+        ranked = sorted(((pair, n) for pair, n in together.items() if n >= min_count),
+                        key=lambda p: (-p[1], p[0]))[:limit]
+        pairs = [(x, y, n, per_item[x], per_item[y]) for (x, y), n in ranked]
+
+    return n_bills, [{
+        'items': (x, y),
+        'bills': n,
+        'support': round(n / n_bills, 4),
+        'confidence': round(n / min(n_x, n_y), 4),
+        'lift': round(n * n_bills / (n_x * n_y), 2),
+    } for x, y, n, n_x, n_y in pairs]
@@ -1,16 +1,50 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, g, has_request_context, \
+    stream_with_context, send_from_directory, abort
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func, extract
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
+from sqlalchemy import func, insert, select, update, delete, event, inspect, text, or_, union_all, cast
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.orm import aliased, joinedload, selectinload, make_transient_to_detached
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, timedelta, timezone
+from collections import OrderedDict
 
 import os
+import io
+import re
+import mimetypes
+import click
+import contextlib
+import functools
+import csv
+import json
+import queue
+import time
+import zlib
+import base64
+import bisect
+import hashlib
+import hmac
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()  # Load variables from .env if present
 
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+import config
+import analytics
+import assets
+import fastjson
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'change-this-secret-key'  # change in production
+app.json = fastjson.provider_class()(app)  # orjson when installed (JSON_PROVIDER overrides)
 
 # DB Configuration
 # 1. Try to get DATABASE_URL from environment (Cloud)
@@ -27,7 +61,55 @@ else:
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+# Pool sizes and timeouts come from the deployment profile (config.py, DB_PROFILE)
+app.config['DB_PROFILE'] = config.profile_name(app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = config.engine_options(app.config['DB_PROFILE'],
+                                                                app.config['SQLALCHEMY_DATABASE_URI'])
+
+# Optional read replica for reports. Views marked @reads_from_reporting send their
+# SELECTs there; everything else, and every write, stays on the primary. The POS bill
+# lookups (/api/bills/last, by_seq, /api/bills/<id>) and the admin bill page are not
+# marked, so a till or an admin always sees the bill it just wrote. Reports may lag the
+# primary by up to REPORTING_MAX_LAG_SECONDS. Caches shared by the whole worker (menu,
+# archive horizon, report invalidations) are always refreshed from the primary.
+REPORTING_BIND = 'reporting'
+reporting_url = os.getenv('REPORTING_DATABASE_URL')
+app.config.setdefault('REPORTING_MAX_LAG_SECONDS', int(os.getenv('REPORTING_MAX_LAG_SECONDS', '30')))
+if reporting_url:
+    if reporting_url.startswith("postgres://"):
+        reporting_url = reporting_url.replace("postgres://", "postgresql://", 1)
+    app.config['SQLALCHEMY_BINDS'] = {REPORTING_BIND: {
+        'url': reporting_url, **config.engine_options(config.profile_name(reporting_url), reporting_url)}}
+
+
+class RoutingSession(FlaskSQLAlchemySession):
+    """Session that reads from the reporting bind inside @reads_from_reporting views."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and has_request_context() and g.get('reporting_reads')
+                and REPORTING_BIND in self._db.engines
+                and not self._flushing and not getattr(clause, 'is_dml', False)):
+            return self._db.engines[REPORTING_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Read from the primary inside a @reads_from_reporting view (for worker-wide caches)."""
+    flag = g.pop('reporting_reads', None) if has_request_context() else None
+    try:
+        yield
+    finally:
+        if flag:
+            g.reporting_reads = flag
+
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
+with app.app_context():
+    config.install_engine_hooks(db.engine, app.config['DB_PROFILE'])
+    if REPORTING_BIND in db.engines:
+        config.install_engine_hooks(db.engines[REPORTING_BIND], config.profile_name(reporting_url))
 
 from werkzeug.security import generate_password_hash
 
@@ -39,6 +121,8 @@ class User(db.Model):
     username = db.Column(db.String(50), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), default='staff')  # 'admin' or 'staff'
+    session_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # bump to log out everywhere
+    store_id = db.Column(db.Integer, db.ForeignKey('store.id'))  # staff's home store; None = any store
 
     def set_password(self, password):
         # Use pbkdf2:sha256 instead of default scrypt (for compatibility)
@@ -48,6 +132,26 @@ class User(db.Model):
         return check_password_hash(self.password_hash, password)
 
 
+class Store(db.Model):
+    """An outlet. Its bills are numbered {code}00001, ... from its own SeqCounter row."""
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(6), unique=True, nullable=False)  # seq_code prefix, letters only, e.g. IL
+    name = db.Column(db.String(100), nullable=False)
+
+
+class Terminal(db.Model):
+    """A till in a store, picked on the login page."""
+    id = db.Column(db.Integer, primary_key=True)
+    store_id = db.Column(db.Integer, db.ForeignKey('store.id'), nullable=False)
+    name = db.Column(db.String(50), nullable=False)
+
+    store = db.relationship('Store')
+
+    __table_args__ = (
+        db.UniqueConstraint('store_id', 'name', name='ux_terminal_store_id_name'),
+    )
+
+
 class Item(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     product_code = db.Column(db.String(20), unique=True, nullable=False)  # human-friendly code / SKU
@@ -66,6 +170,22 @@ class Bill(db.Model):
     note = db.Column(db.String(255))  # reason for refund/cancel, optional
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     user = db.relationship('User', backref='bills')
+    client_key = db.Column(db.String(64))  # idempotency key from /api/bills/batch, optional
+    # Bills from before stores existed belong to the first store (the original shop)
+    store_id = db.Column(db.Integer, db.ForeignKey('store.id'), nullable=False, server_default='1')
+    terminal_id = db.Column(db.Integer, db.ForeignKey('terminal.id'))
+
+    __table_args__ = (
+        # report periods; total_amount / user_id included so analytics reads only the index
+        db.Index('ix_bill_report_period', 'status', 'created_at', 'total_amount', 'user_id'),
+        db.Index('ix_bill_store_report_period', 'store_id', 'status', 'created_at', 'total_amount', 'user_id'),
+        db.Index('ix_bill_created_at_id', 'created_at', 'id'),  # latest bills, keyset pages
+        db.Index('ix_bill_store_created_at_id', 'store_id', 'created_at', 'id'),  # a store's latest bills
+        db.Index('ix_bill_user_created_at_id', 'user_id', 'created_at', 'id'),  # bills by staff
+        db.Index('ux_bill_client_key', 'client_key', unique=True),
+        # SQLite: never hand out an id again, even once the highest ids were archived
+        {'sqlite_autoincrement': True},
+    )
 
 
 class BillItem(db.Model):
@@ -79,6 +199,320 @@ class BillItem(db.Model):
     bill = db.relationship('Bill', backref='items')
     item = db.relationship('Item')
 
+    __table_args__ = (
+        db.Index('ix_bill_item_bill_id_item_id', 'bill_id', 'item_id'),  # lines of a bill, baskets
+        db.Index('ix_bill_item_item_id_bill_id', 'item_id', 'bill_id'),
+        {'sqlite_autoincrement': True},
+    )
+
+
+class ArchivedBill(db.Model):
+    """Bills moved out of `bill` by `flask archive-bills`: same columns and ids, read-only."""
+    __tablename__ = 'bill_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    seq_code = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime)
+    customer_name = db.Column(db.String(100))
+    total_amount = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    note = db.Column(db.String(255))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    client_key = db.Column(db.String(64))
+    store_id = db.Column(db.Integer, db.ForeignKey('store.id'), nullable=False, server_default='1')
+    terminal_id = db.Column(db.Integer, db.ForeignKey('terminal.id'))
+    archived_at = db.Column(db.DateTime, server_default=func.now(), nullable=False)
+
+    # Read-only counterparts of Bill.user / Bill.items, so serialize_bill and the bill page work
+    user = db.relationship('User', viewonly=True)
+    items = db.relationship('ArchivedBillItem', order_by='ArchivedBillItem.id', viewonly=True)
+
+    __table_args__ = (
+        db.Index('ix_bill_archive_report_period', 'status', 'created_at', 'total_amount', 'user_id'),
+        db.Index('ix_bill_archive_store_report_period', 'store_id', 'status', 'created_at', 'total_amount', 'user_id'),
+        db.Index('ix_bill_archive_created_at_id', 'created_at', 'id'),
+    )
+
+
+class ArchivedBillItem(db.Model):
+    """Lines of archived bills."""
+    __tablename__ = 'bill_item_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    bill_id = db.Column(db.Integer, db.ForeignKey('bill_archive.id'))
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'))
+    quantity = db.Column(db.Integer, nullable=False)
+    refunded_qty = db.Column(db.Integer, default=0)
+    line_total = db.Column(db.Float, nullable=False)
+
+    item = db.relationship('Item', viewonly=True)
+
+    __table_args__ = (
+        db.Index('ix_bill_item_archive_bill_id_item_id', 'bill_id', 'item_id'),
+    )
+
+
+class ArchiveRun(db.Model):
+    """One `flask archive-bills` run; the newest cutoff tells readers where the archive starts."""
+    id = db.Column(db.Integer, primary_key=True)
+    cutoff = db.Column(db.DateTime, nullable=False)  # bills created before this are archived
+    bills_moved = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime)
+
+
+class DailySales(db.Model):
+    """Bill-level rollup: one row per (store, day), ACTIVE bills only."""
+    store_id = db.Column(db.Integer, db.ForeignKey('store.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    bill_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)  # sum of Bill.total_amount
+
+
+class DailyItemSales(db.Model):
+    """Item-level rollup: one row per (store, day, item), ACTIVE bills only."""
+    store_id = db.Column(db.Integer, db.ForeignKey('store.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), primary_key=True)
+    category = db.Column(db.String(50), nullable=False)
+    qty = db.Column(db.Integer, nullable=False, default=0)  # sum of BillItem.quantity
+    revenue = db.Column(db.Float, nullable=False, default=0)  # sum of BillItem.line_total
+    bill_count = db.Column(db.Integer, nullable=False, default=0)  # bills containing the item
+
+    item = db.relationship('Item')
+
+
+class CacheVersion(db.Model):
+    """Counters bumped on writes so every worker can tell its cached copy is stale."""
+    name = db.Column(db.String(50), primary_key=True)  # e.g. 'catalog'
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ReportTouch(db.Model):
+    """Log of past days whose numbers changed (old bill refunded/cancelled), read by report caches."""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    touched_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SeqCounter(db.Model):
+    """Next unreserved bill number per sequence; workers reserve blocks from it."""
+    name = db.Column(db.String(50), primary_key=True)  # e.g. 'bill:IL', one per store
+    next_value = db.Column(db.Integer, nullable=False)
+
+
+class SchemaVersion(db.Model):
+    """Applied schema migrations (see MIGRATIONS)."""
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(255), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ---------- Migrations ----------
+# create_all() only creates missing tables, so changes to existing tables are
+# applied here as numbered steps. Each runs once and is recorded in SchemaVersion.
+# Statements must work on both SQLite and Postgres. A released step is never changed:
+# it has already run on deployed databases, so a fix goes in a new step. Steps name
+# the indexes they create, because "every index of the model" grows with later
+# migrations. Migration 1 once created all of them, and with the batch endpoint that
+# included ux_bill_client_key before step 2 added its column.
+
+def _add_columns(model, *names):
+    """ALTER TABLE ... ADD COLUMN for model columns the live table doesn't have yet."""
+    def migrate(conn):
+        table = model.__table__
+        existing = {c['name'] for c in inspect(conn).get_columns(table.name)}
+        table_name = conn.dialect.identifier_preparer.format_table(table)  # "user" is reserved on Postgres
+        for name in names:
+            if name not in existing:
+                column_ddl = CreateColumn(table.c[name]).compile(dialect=conn.dialect)
+                conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_ddl}'))
+    return migrate
+
+
+def _steps(*steps):
+    def migrate(conn):
+        for step in steps:
+            step(conn)
+    return migrate
+
+
+def _seed_bill_counter(conn):
+    # Existing codes are IL{bill.id}, so numbering continues after the highest id.
+    start = (conn.execute(select(func.max(Bill.id))).scalar() or 0) + 1
+    conn.execute(insert(SeqCounter).values(name='bill', next_value=start))
+
+
+def _create_indexes(*names):
+    """
+    Create the named model indexes (as declared in __table_args__) if missing. Names
+    no longer declared were replaced by a later migration and are skipped.
+    """
+    def migrate(conn):
+        indexes = {ix.name: ix for table in db.metadata.tables.values() for ix in table.indexes}
+        for name in names:
+            if name in indexes:
+                indexes[name].create(conn, checkfirst=True)
+    return migrate
+
+
+def _create_tables(*models):
+    """Tables added after a database was created (create_all only runs on db-init)."""
+    def migrate(conn):
+        for model in models:
+            model.__table__.create(conn, checkfirst=True)
+    return migrate
+
+
+def _drop_tables(*models):
+    def migrate(conn):
+        for model in models:
+            model.__table__.drop(conn, checkfirst=True)
+    return migrate
+
+
+def _default_store(conn):
+    # Until now there was one shop: its bills (store_id 1) keep their IL... codes and counter
+    if conn.execute(select(Store.id)).first() is None:
+        conn.execute(insert(Store).values(code=DEFAULT_STORE_CODE, name='Ice Land'))
+    conn.execute(update(SeqCounter).where(SeqCounter.name == 'bill')
+                 .values(name=store_counter_name(DEFAULT_STORE_CODE)))
+
+
+def _drop_indexes(*names):
+    def migrate(conn):
+        for name in names:
+            conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+    return migrate
+
+
+def _sqlite_autoincrement(*tables):
+    """
+    SQLite only: rebuild tables as AUTOINCREMENT (it can't be added in place) and start
+    their ids after the highest one ever used, archive included. Without it SQLite
+    reuses the ids of archived bills. tables: (table name, archive table name).
+    The rebuild starts from the table as it is (its own CREATE TABLE, columns and
+    indexes), never from the model, which later steps keep changing. Postgres
+    sequences never go back, so there is nothing to do there.
+    """
+    def migrate(conn):
+        if conn.dialect.name != 'sqlite':
+            return
+        for name, archive_name in tables:
+            ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                               {'name': name}).scalar()
+            if 'AUTOINCREMENT' not in ddl.upper():  # else create_all made it from a newer model
+                rebuilt = f'{name}_rebuild'
+                ddl, renamed = re.subn(rf'^CREATE TABLE "?{name}"? \(', f'CREATE TABLE {rebuilt} (', ddl)
+                ddl, inline = re.subn(r'\bid INTEGER NOT NULL,', 'id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,', ddl, 1)
+                ddl, dropped = re.subn(r',\s*PRIMARY KEY \(id\)', '', ddl, 1)
+                if not renamed == inline == dropped == 1:
+                    raise RuntimeError(f'Unexpected schema for table {name}: {ddl}')
+                columns = ', '.join(row.name for row in conn.execute(text(f'PRAGMA table_info({name})')))
+                index_ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'index' "
+                                              "AND tbl_name = :name AND sql IS NOT NULL"), {'name': name}).scalars().all()
+                conn.execute(text(ddl))
+                conn.execute(text(f'INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {name}'))
+                conn.execute(text(f'DROP TABLE {name}'))
+                conn.execute(text(f'ALTER TABLE {rebuilt} RENAME TO {name}'))
+                for statement in index_ddl:
+                    conn.execute(text(statement))
+
+            last_id = max(conn.execute(text(f'SELECT max(id) FROM {name}')).scalar() or 0,
+                          conn.execute(text(f'SELECT max(id) FROM {archive_name}')).scalar() or 0)
+            conn.execute(text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': name})
+            conn.execute(text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                         {'name': name, 'seq': last_id})
+    return migrate
+
+
+def _store_rollups(conn):
+    # Step 8's rollup tables and their fill, written out as released: the models and
+    # fill_rollups() move on, and later steps change these tables from this shape.
+    conn.execute(text(
+        'CREATE TABLE daily_sales ('
+        ' store_id INTEGER NOT NULL, day DATE NOT NULL, bill_count INTEGER NOT NULL, revenue FLOAT NOT NULL,'
+        ' PRIMARY KEY (store_id, day), FOREIGN KEY(store_id) REFERENCES store (id))'))
+    conn.execute(text(
+        'CREATE TABLE daily_item_sales ('
+        ' store_id INTEGER NOT NULL, day DATE NOT NULL, item_id INTEGER NOT NULL, category VARCHAR(50) NOT NULL,'
+        ' qty INTEGER NOT NULL, revenue FLOAT NOT NULL, bill_count INTEGER NOT NULL,'
+        ' PRIMARY KEY (store_id, day, item_id),'
+        ' FOREIGN KEY(store_id) REFERENCES store (id), FOREIGN KEY(item_id) REFERENCES item (id))'))
+    bills = ('(SELECT id, store_id, created_at, total_amount, status FROM bill'
+             ' UNION ALL SELECT id, store_id, created_at, total_amount, status FROM bill_archive)')
+    lines = ('(SELECT bill_id, item_id, quantity, line_total FROM bill_item'
+             ' UNION ALL SELECT bill_id, item_id, quantity, line_total FROM bill_item_archive)')
+    conn.execute(text(
+        'INSERT INTO daily_sales (store_id, day, bill_count, revenue)'
+        ' SELECT b.store_id, date(b.created_at), count(b.id), sum(b.total_amount)'
+        f' FROM {bills} AS b WHERE b.status = \'ACTIVE\''
+        ' GROUP BY b.store_id, date(b.created_at)'))
+    conn.execute(text(
+        'INSERT INTO daily_item_sales (store_id, day, item_id, category, qty, revenue, bill_count)'
+        ' SELECT b.store_id, date(b.created_at), l.item_id, item.category,'
+        ' sum(l.quantity), sum(l.line_total), count(DISTINCT b.id)'
+        f' FROM {lines} AS l JOIN {bills} AS b ON b.id = l.bill_id JOIN item ON item.id = l.item_id'
+        ' WHERE b.status = \'ACTIVE\''
+        ' GROUP BY b.store_id, date(b.created_at), l.item_id, item.category'))
+
+
+def _customer_name_trigram_index(conn):
+    # Postgres only: lets "customer name contains" searches use an index.
+    # pg_trgm may not be installable without superuser; the search still works without it.
+    if conn.dialect.name != 'postgresql':
+        return
+    try:
+        with conn.begin_nested():
+            conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_bill_customer_name_trgm '
+                              'ON bill USING gin (lower(customer_name) gin_trgm_ops)'))
+    except (OperationalError, ProgrammingError) as e:
+        app.logger.warning('Skipping trigram index on bill.customer_name: %s', e)
+
+
+MIGRATIONS = [
+    (1, 'Indexes for bill periods and bill item lookups',
+     # the indexes the models declared when this step was released
+     _create_indexes('ix_bill_status_created_at', 'ix_bill_created_at',
+                     'ix_bill_item_bill_id', 'ix_bill_item_item_id_bill_id')),
+    (2, 'Bill.client_key for idempotent batch ingestion',
+     _steps(_add_columns(Bill, 'client_key'), _create_indexes('ux_bill_client_key'))),
+    (3, 'Block-allocated bill sequence codes', _seed_bill_counter),
+    (4, 'Keyset bill search indexes',
+     _steps(_create_indexes('ix_bill_created_at_id', 'ix_bill_user_created_at_id'),
+            _drop_indexes('ix_bill_created_at'),
+            _customer_name_trigram_index)),
+    (5, 'User.session_version for session revocation', _add_columns(User, 'session_version')),
+    (6, 'Bill archive tables', _create_tables(ArchivedBill, ArchivedBillItem, ArchiveRun)),
+    (7, 'Covering indexes for analytics reports',
+     _steps(_create_indexes('ix_bill_report_period', 'ix_bill_item_bill_id_item_id',
+                            'ix_bill_archive_report_period', 'ix_bill_item_archive_bill_id_item_id'),
+            _drop_indexes('ix_bill_status_created_at', 'ix_bill_item_bill_id',
+                          'ix_bill_archive_status_created_at', 'ix_bill_item_archive_bill_id'))),
+    (8, 'Stores and terminals: per-store bills, bill counters and rollups',
+     _steps(_create_tables(Store, Terminal),
+            _add_columns(User, 'store_id'),
+            _add_columns(Bill, 'store_id', 'terminal_id'),
+            _add_columns(ArchivedBill, 'store_id', 'terminal_id'),
+            _default_store,
+            _create_indexes('ix_bill_store_report_period', 'ix_bill_store_created_at_id',
+                            'ix_bill_archive_store_report_period'),
+            # store_id joins the rollups' primary keys: recreate them and refill from the bills
+            _drop_tables(DailyItemSales, DailySales),
+            _store_rollups)),
+    (9, 'Never reuse bill and bill line ids on SQLite',
+     _sqlite_autoincrement(('bill', 'bill_archive'), ('bill_item', 'bill_item_archive'))),
+]
+
+
+def run_migrations():
+    applied = {v for (v,) in db.session.query(SchemaVersion.version)}
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        migrate(db.session.connection())
+        db.session.add(SchemaVersion(version=version, description=description))
+        db.session.commit()
+
 
 # ---------- Seed data ----------
 
@@ -95,6 +529,7 @@ def seed_data():
         try:
             if admin.check_password('admin123'):
                 admin.set_password('Iceland@2025')
+                admin.session_version = (admin.session_version or 0) + 1
         except Exception:
             # If hashing format differs, do not block startup.
             pass
@@ -175,6 +610,7 @@ def seed_data():
 
         for code, cat, name, price in items:
             db.session.add(Item(product_code=code, category=cat, name=name, price=price))
+        bump_cache_version('catalog')
 
     # Ensure Cone exists even if DB already had items seeded earlier
     cone = Item.query.filter_by(product_code='EX-003').first()
@@ -183,6 +619,7 @@ def seed_data():
         existing_by_name = Item.query.filter_by(category='Extras', name='Cone').first()
         if not existing_by_name:
             db.session.add(Item(product_code='EX-003', category='Extras', name='Cone', price=35))
+            bump_cache_version('catalog')
 
     db.session.commit()
 
@@ -190,37 +627,420 @@ def seed_data():
 def init_db():
     """Create all tables and seed initial data."""
     db.create_all()
+    run_migrations()
+    seed_data()
+
+    # Backfill rollups once for databases that had bills before the rollup tables existed.
+    if not db.session.query(DailySales.day).first() and db.session.query(Bill.id).first():
+        rebuild_rollups()
+
+
+def schema_is_current():
+    """One cheap query: has every migration been applied? False if the schema doesn't exist yet."""
+    try:
+        with db.engine.connect() as conn:
+            version = conn.execute(select(func.max(SchemaVersion.version))).scalar()
+    except (OperationalError, ProgrammingError):
+        return False
+    return version == MIGRATIONS[-1][0]
+
+
+@app.cli.command('db-init')
+def db_init_command():
+    """Create tables, apply migrations and seed users/menu (run once per deploy)."""
+    init_db()
+    print(f"✅ Schema at version {MIGRATIONS[-1][0]}, seed data in place.")
+
+
+@app.cli.command('revoke-sessions')
+@click.argument('username')
+def revoke_sessions_command(username):
+    """Log USERNAME out everywhere (also do this after changing a role or password)."""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        print(f"❌ No user named {username}.")
+        return
+    user.session_version = (user.session_version or 0) + 1
+    db.session.commit()
+    print(f"✅ Sessions of {username} revoked (takes effect within {app.config['SESSION_CHECK_SECONDS']:.0f}s).")
+
+
+@app.cli.command('seed')
+def seed_command():
+    """Seed default users and menu items if missing."""
     seed_data()
+    print("✅ Seed data in place.")
+
+
+@app.cli.command('create-store')
+@click.argument('code')
+@click.argument('name')
+def create_store_command(code, name):
+    """Add a store; its bills are numbered CODE00001, CODE00002, ..."""
+    code = code.strip().upper()
+    if not STORE_CODE_RE.match(code):
+        raise click.BadParameter('2 to 6 letters, e.g. KR', param_hint='CODE')
+    if Store.query.filter_by(code=code).first():
+        print(f"❌ Store {code} already exists.")
+        return
+    db.session.add(Store(code=code, name=name))
+    db.session.add(SeqCounter(name=store_counter_name(code), next_value=1))
+    db.session.commit()
+    print(f"✅ Store {code} ({name}) created; its bills start at {code}00001.")
+
+
+@app.cli.command('create-terminal')
+@click.argument('store_code')
+@click.argument('name')
+def create_terminal_command(store_code, name):
+    """Add a till to a store; it is picked on the login page."""
+    store = Store.query.filter_by(code=store_code.strip().upper()).first()
+    if not store:
+        print(f"❌ No store {store_code}.")
+        return
+    if Terminal.query.filter_by(store_id=store.id, name=name).first():
+        print(f"❌ {store.code} already has a till named {name}.")
+        return
+    db.session.add(Terminal(store_id=store.id, name=name))
+    db.session.commit()
+    print(f"✅ Till {name} added to {store.code}.")
+
+
+@app.cli.command('assign-store')
+@click.argument('username')
+@click.argument('store_code', required=False)
+def assign_store_command(username, store_code):
+    """Tie USERNAME to a store (omit STORE_CODE to allow any store); logs them out."""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        print(f"❌ No user named {username}.")
+        return
+    store = Store.query.filter_by(code=store_code.strip().upper()).first() if store_code else None
+    if store_code and not store:
+        print(f"❌ No store {store_code}.")
+        return
+    user.store_id = store.id if store else None
+    user.session_version = (user.session_version or 0) + 1  # open sessions still sell for the old store
+    db.session.commit()
+    print(f"✅ {username} now sells for {store.code if store else 'any store'}.")
 
 
 # ---------- 🔒 RENDER / GUNICORN SAFE FIX (ONLY ADDITION) ----------
+# Deploys should run `flask db-init` (see Procfile release). Workers then only check
+# the schema version once on their first request; set DB_INIT_ON_START=0 to skip
+# even that. A fresh or outdated database is still initialized here as a fallback.
+
+app.config.setdefault('DB_INIT_ON_START', os.getenv('DB_INIT_ON_START', '1') != '0')
+
 
 @app.before_request
 def ensure_db_initialized():
     if not getattr(app, "_db_ready", False):
-        with app.app_context():
-            init_db()
+        if app.config['DB_INIT_ON_START'] and not schema_is_current():
+            with app.app_context():
+                init_db()
         app._db_ready = True
 
+# ---------- Query budget ----------
+# Every SQL statement issued while handling a request is counted in g.query_count.
+# Views can declare a fixed budget with @query_budget(n); in debug/testing mode a
+# request that goes over it fails, so N+1 regressions show up immediately.
+# The periodic session-version check (get_current_user) is not charged to the view.
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+        g.query_started = time.perf_counter()
+
+
+@app.before_request
+def reset_query_count():
+    # Runs after ensure_db_initialized, so first-request setup is not counted.
+    g.query_count = 0
+    g.request_started = time.perf_counter()
+
+
+def query_budget(max_queries):
+    """Declare the maximum number of SQL statements a view may issue (innermost decorator)."""
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+@app.after_request
+def check_query_budget(response):
+    if app.debug or app.testing:
+        budget = getattr(app.view_functions.get(request.endpoint), 'query_budget', None)
+        used = g.get('query_count', 0) - g.get('budget_exempt_queries', 0)
+        if budget is not None and used > budget:
+            raise AssertionError(f"{request.endpoint} issued {used} SQL statements (budget {budget})")
+    return response
+
+
+# ---------- Metrics ----------
+# Per-endpoint request latency, status codes, SQL statements and SQL time per request,
+# and connection checkout wait and pool use per database (`bind` label: primary, and
+# reporting when REPORTING_DATABASE_URL is set), served in Prometheus text format on /metrics.
+# Numbers are per process: every gunicorn worker keeps its own, and all series carry a
+# `pid` label so counters from different workers don't look like resets.
+# Recording is a handful of perf_counter() calls and one short lock per request.
+
+app.config.setdefault('METRICS_TOKEN', os.getenv('METRICS_TOKEN'))  # lets a scraper in without an admin session
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+CHECKOUT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+GROUP_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class Histogram:
+    """Cumulative Prometheus histogram with one series per label tuple."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}  # labels -> [per-bucket counts (+Inf last), sum, count]
+
+    def observe(self, labels, value):
+        s = self.series.get(labels)
+        if s is None:
+            s = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        s[0][bisect.bisect_left(self.buckets, value)] += 1
+        s[1] += value
+        s[2] += 1
+
+    def render(self, out, extra_labels):
+        out.append(f"# HELP {self.name} {self.help_text}")
+        out.append(f"# TYPE {self.name} histogram")
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            base = _metric_labels(self.label_names, labels) + extra_labels
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                out.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            out.append(f"{self.name}_sum{{{base}}} {total:.6f}")
+            out.append(f"{self.name}_count{{{base}}} {count}")
+
+
+def _metric_labels(names, values):
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ''.join(f'{n}="{escape(v)}",' for n, v in zip(names, values))
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = {}  # (endpoint, method, status) -> count
+        self.latency = Histogram('pos_http_request_duration_seconds', 'Time to build the response, by endpoint.',
+                                 ('endpoint',), LATENCY_BUCKETS)
+        self.sql_count = Histogram('pos_sql_statements_per_request', 'SQL statements issued per request, by endpoint.',
+                                   ('endpoint',), SQL_COUNT_BUCKETS)
+        self.sql_time = Histogram('pos_sql_seconds_per_request', 'Time spent in SQL per request, by endpoint.',
+                                  ('endpoint',), LATENCY_BUCKETS)
+        self.checkout_wait = Histogram('pos_db_checkout_wait_seconds',
+                                       'Time to get a database connection from the pool (includes connecting), by bind.',
+                                       ('bind',), CHECKOUT_BUCKETS)
+        self.group_size = Histogram('pos_bill_group_commit_size', 'Bills committed per group commit (BILL_GROUP_COMMIT).',
+                                    (), GROUP_SIZE_BUCKETS)
+
+    def record_request(self, endpoint, method, status, seconds, sql_count, sql_seconds):
+        key = (endpoint,)
+        with self._lock:
+            rkey = (endpoint, method, status)
+            self.requests[rkey] = self.requests.get(rkey, 0) + 1
+            self.latency.observe(key, seconds)
+            self.sql_count.observe(key, sql_count)
+            self.sql_time.observe(key, sql_seconds)
+
+    def record_checkout(self, bind, seconds):
+        with self._lock:
+            self.checkout_wait.observe((bind,), seconds)
+
+    def record_group_commit(self, size):
+        with self._lock:
+            self.group_size.observe((), size)
+
+    def render(self):
+        extra = f'pid="{os.getpid()}"'
+        out = [
+            "# HELP pos_process_start_time_seconds Start time of this worker, seconds since the epoch.",
+            "# TYPE pos_process_start_time_seconds gauge",
+            f"pos_process_start_time_seconds{{{extra}}} {self.started_at:.3f}",
+            "# HELP pos_http_requests_total Requests handled, by endpoint, method and status.",
+            "# TYPE pos_http_requests_total counter",
+        ]
+        with self._lock:
+            for labels, n in sorted(self.requests.items()):
+                out.append(f"pos_http_requests_total{{{_metric_labels(('endpoint', 'method', 'status'), labels)}{extra}}} {n}")
+            for hist in (self.latency, self.sql_count, self.sql_time, self.checkout_wait, self.group_size):
+                hist.render(out, extra)
+
+        # QueuePool only; NullPool has no pool to report on
+        pools = [(bind, engine.pool) for bind, engine in bind_engines() if hasattr(engine.pool, 'checkedout')]
+        if pools:
+            out += ["# HELP pos_db_pool_checked_out Connections currently in use, by bind.",
+                    "# TYPE pos_db_pool_checked_out gauge"]
+            out += [f'pos_db_pool_checked_out{{bind="{bind}",{extra}}} {pool.checkedout()}' for bind, pool in pools]
+            out += ["# HELP pos_db_pool_size Configured pool size, by bind.",
+                    "# TYPE pos_db_pool_size gauge"]
+            out += [f'pos_db_pool_size{{bind="{bind}",{extra}}} {pool.size()}' for bind, pool in pools]
+        return '\n'.join(out) + '\n'
+
+
+metrics = Metrics()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _time_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_started' in g:
+        g.sql_seconds = g.get('sql_seconds', 0.0) + time.perf_counter() - g.pop('query_started')
+
+
+def bind_engines():
+    """[(bind label, engine)]: the primary, then the reporting database if it has its own engine."""
+    engines = [('primary', db.engine)]
+    if db.engines.get(REPORTING_BIND, db.engine) is not db.engine:
+        engines.append((REPORTING_BIND, db.engines[REPORTING_BIND]))
+    return engines
+
+
+def _time_pool_checkout(bind, engine):
+    """Wrap engine.raw_connection (every checkout goes through it; survives dispose())."""
+    raw_connection = engine.raw_connection
+
+    @functools.wraps(raw_connection)
+    def timed_raw_connection():
+        t0 = time.perf_counter()
+        try:
+            return raw_connection()
+        finally:
+            metrics.record_checkout(bind, time.perf_counter() - t0)
+
+    engine.raw_connection = timed_raw_connection
+
+
+with app.app_context():
+    for bind, engine in bind_engines():
+        _time_pool_checkout(bind, engine)
+
+
+@app.after_request
+def remember_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def record_request_metrics(exc):
+    started = g.get('request_started')
+    if started is None:
+        return
+    metrics.record_request(
+        request.endpoint or 'unmatched',  # unmatched URLs share one series
+        request.method,
+        '500' if exc is not None else str(g.get('response_status', 500)),
+        time.perf_counter() - started,
+        g.get('query_count', 0),
+        g.get('sql_seconds', 0.0),
+    )
+
+
 # ---------- Auth helpers ----------
+# The signed session carries user_id, username, role and the user's session_version
+# at login. get_current_user() builds the user from it once per request (g), so the
+# hot POS paths don't query the user table. Revocation: bumping User.session_version
+# (flask revoke-sessions) ends existing sessions; each worker re-reads a user's
+# version at most every SESSION_CHECK_SECONDS.
+
+app.config.setdefault('SESSION_CHECK_SECONDS', float(os.getenv('SESSION_CHECK_SECONDS', '30')))
+
+_session_versions = {}  # user_id -> (session_version or None if deleted, checked_at)
+
+
+def _live_session_version(user_id):
+    cached = _session_versions.get(user_id)
+    now = time.monotonic()
+    if cached and now - cached[1] < app.config['SESSION_CHECK_SECONDS']:
+        return cached[0]
+    version = db.session.query(User.session_version).filter_by(id=user_id).scalar()
+    g.budget_exempt_queries = g.get('budget_exempt_queries', 0) + 1  # periodic, not the view's work
+    _session_versions[user_id] = (version, now)
+    return version
+
+
+def home_store(user):
+    """The store a user sells for when no till was picked: their own, else the first store."""
+    query = Store.query.filter_by(id=user.store_id) if user.store_id else Store.query.order_by(Store.id)
+    return query.first()
+
+
+def _set_session_store(store, terminal=None):
+    session['store_id'] = store.id
+    session['store_code'] = store.code
+    session['terminal_id'] = terminal.id if terminal else None
+
+
+def start_user_session(user, terminal=None):
+    session.clear()
+    session['user_id'] = user.id
+    session['username'] = user.username
+    session['role'] = user.role
+    session['sv'] = user.session_version or 0
+    _set_session_store(terminal.store if terminal else home_store(user), terminal)
+
+
+def current_till():
+    """(store_id, store_code, terminal_id) the logged-in POS sells for."""
+    return session['store_id'], session['store_code'], session.get('terminal_id')
+
+
+def get_current_user():
+    """The logged-in user (detached User with id/username/role) or None; resolved once per request."""
+    if 'current_user' in g:
+        return g.current_user
+
+    user = None
+    user_id = session.get('user_id')
+    if user_id is not None and 'sv' not in session:
+        # Session from before role/version were stored in it: fill them in once.
+        db_user = db.session.get(User, user_id)
+        if db_user:
+            start_user_session(db_user)
+        else:
+            session.clear()
+    elif 'sv' in session and 'store_id' not in session:
+        # Session from before stores existed: sell for the user's home store.
+        db_user = db.session.get(User, user_id)
+        if db_user:
+            _set_session_store(home_store(db_user))
+
+    if 'sv' in session:
+        if _live_session_version(session['user_id']) == session['sv']:
+            user = User(id=session['user_id'], username=session['username'], role=session['role'])
+            make_transient_to_detached(user)  # merge(user, load=False) to attach without a SELECT
+        else:
+            session.clear()
+
+    g.current_user = user
+    return user
+
 
 def login_required(view_func):
     from functools import wraps
 
     @wraps(view_func)
     def wrapper(*args, **kwargs):
-        if 'user_id' not in session:
+        if get_current_user() is None:
             return redirect(url_for('login'))
         return view_func(*args, **kwargs)
     return wrapper
 
 
-def get_current_user():
-    if 'user_id' in session:
-        return User.query.get(session['user_id'])
-    return None
-
-
 def admin_required(view_func):
     from functools import wraps
 
@@ -233,10 +1053,95 @@ def admin_required(view_func):
     return wrapper
 
 
+def reads_from_reporting(view_func):
+    """
+    Run a read-only view's queries on the reporting database (REPORTING_DATABASE_URL),
+    if one is configured. Put it below the auth decorator: the login check stays on the
+    primary.
+    """
+    @functools.wraps(view_func)
+    def wrapper(*args, **kwargs):
+        g.reporting_reads = True
+        return view_func(*args, **kwargs)
+    return wrapper
+
+
 # ---------- Utility ----------
 
+# Loader options for anything passed to serialize_bill or the bill templates:
+# user in the same SELECT, then all lines and their items in one extra SELECT.
+BILL_LOAD_OPTIONS = (
+    joinedload(Bill.user),
+    selectinload(Bill.items).joinedload(BillItem.item),
+)
+ARCHIVED_BILL_LOAD_OPTIONS = (
+    joinedload(ArchivedBill.user),
+    selectinload(ArchivedBill.items).joinedload(ArchivedBillItem.item),
+)
+
+
+def find_bill(live_query, archive_query=None, **filters):
+    """
+    One bill by filters (filter_by), loaded for serialize_bill, from the live table or, once
+    it was archived, as a read-only ArchivedBill; None if neither has it.
+    """
+    bill = live_query.options(*BILL_LOAD_OPTIONS).filter_by(**filters).first()
+    if bill is None and archive_horizon() is not None:
+        archive_query = archive_query if archive_query is not None else ArchivedBill.query
+        bill = archive_query.options(*ARCHIVED_BILL_LOAD_OPTIONS).filter_by(**filters).first()
+    return bill
+
+
+SQLITE_WRITE_ATTEMPTS = 3  # each waits up to SQLITE_BUSY_TIMEOUT_MS for the lock
+
+
+def begin_write():
+    """
+    Start the session's write transaction. Call it before the first write, after any
+    bill numbers are allocated (that commits on another connection, which would wait on
+    this one's lock). No-op except on SQLite.
+    SQLite: BEGIN IMMEDIATE takes the database write lock now, waiting busy_timeout for
+    it, instead of at the first INSERT/UPDATE of a transaction that may already have
+    read an older snapshot. Gives up with a 503 after SQLITE_WRITE_ATTEMPTS tries.
+    """
+    if db.session.get_bind().dialect.name != 'sqlite':
+        return
+    dbapi_connection = db.session.connection().connection.dbapi_connection
+    if dbapi_connection.in_transaction:
+        return  # already wrote something, so the lock is held
+    for attempt in range(1, SQLITE_WRITE_ATTEMPTS + 1):
+        # Straight on the DBAPI cursor: sqlite3 then knows it is in a transaction and
+        # commits it with the session.
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            return
+        except dbapi_connection.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+        finally:
+            cursor.close()
+        time.sleep(0.05 * attempt)
+    response = jsonify({'error': 'Database is busy, please try again'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    abort(response)
+
+
+def lock_bill(bill_id, *options):
+    """
+    Load a bill for read-modify-write; 404 if missing. Every writer to an existing bill
+    (refunds, status changes) goes through here, so they queue up per bill instead of
+    overwriting each other, and the rollup change is based on the bill's current state.
+    Postgres: SELECT ... FOR UPDATE holds the row until commit. SQLite has no row locks:
+    begin_write() takes the database write lock first, so the read below is current.
+    """
+    begin_write()
+    return Bill.query.options(*options).filter_by(id=bill_id).with_for_update(of=Bill).first_or_404()
+
+
 def serialize_bill(bill: Bill):
-    """Return a dict that frontend can use to print/reopen."""
+    """Return a dict that frontend can use to print/reopen. Load bill with BILL_LOAD_OPTIONS."""
     return {
         'bill_id': bill.id,
         'seq_code': bill.seq_code,
@@ -246,6 +1151,8 @@ def serialize_bill(bill: Bill):
         'status': bill.status,
         'note': bill.note,
         'user': bill.user.username if bill.user else None,
+        'store_id': bill.store_id,
+        'terminal_id': bill.terminal_id,
         'items': [
             {
                 'bill_item_id': bi.id,
@@ -261,19 +1168,951 @@ def serialize_bill(bill: Bill):
     }
 
 
+def report_period(rtype, date_str):
+    """
+    Half-open [start, end) date range for a report period.
+    daily: YYYY-MM-DD, monthly: YYYY-MM, yearly: YYYY. Raises ValueError on bad input;
+    returns (None, None) for an unknown type (no filtering).
+    """
+    if rtype == 'daily':
+        start = datetime.strptime(date_str, '%Y-%m-%d').date()
+        return start, start + timedelta(days=1)
+    if rtype == 'monthly':
+        parts = date_str.split('-')
+        year, month = int(parts[0]), int(parts[1])
+        start = date(year, month, 1)
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        return start, end
+    if rtype == 'yearly':
+        year = int(date_str)
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    return None, None
+
+
+# ---------- Sales rollups ----------
+# DailySales / DailyItemSales hold the numbers of ACTIVE bills per store and day.
+# Every write that changes them (new bill, status change, refund) updates the
+# rollups in the same transaction, so reports read a few rows per day instead of
+# scanning bills. Each store only ever updates its own rows.
+
+def _upsert(model):
+    """INSERT statement with ON CONFLICT support for the current dialect."""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
+def bump_daily_sales(store_id, day, revenue, bill_count=0):
+    """Atomically add revenue / bill_count (may be negative) to a store's day in the rollup."""
+    touch_report_day(day)
+    stmt = _upsert(DailySales).values(store_id=store_id, day=day, revenue=revenue, bill_count=bill_count)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['store_id', 'day'],
+        set_={
+            'revenue': DailySales.revenue + stmt.excluded.revenue,
+            'bill_count': DailySales.bill_count + stmt.excluded.bill_count,
+        },
+    )
+    db.session.execute(stmt)
+
+
+def _add_item_totals(totals, lines, sign=1):
+    """Fold one bill's lines into totals {item_id: [category, qty, revenue, bill_count]}."""
+    seen = set()
+    for item_id, category, qty, line_total in lines:
+        entry = totals.setdefault(item_id, [category, 0, 0.0, 0])
+        entry[1] += sign * qty
+        entry[2] += sign * line_total
+        if item_id not in seen:
+            seen.add(item_id)
+            entry[3] += sign
+
+
+def _bump_item_rollup(store_id, day, totals):
+    if not totals:
+        return
+
+    stmt = _upsert(DailyItemSales).values([
+        {
+            'store_id': store_id,
+            'day': day,
+            'item_id': item_id,
+            'category': category,
+            'qty': qty,
+            'revenue': revenue,
+            'bill_count': bill_count,
+        }
+        for item_id, (category, qty, revenue, bill_count) in totals.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['store_id', 'day', 'item_id'],
+        set_={
+            'qty': DailyItemSales.qty + stmt.excluded.qty,
+            'revenue': DailyItemSales.revenue + stmt.excluded.revenue,
+            'bill_count': DailyItemSales.bill_count + stmt.excluded.bill_count,
+        },
+    )
+    db.session.execute(stmt)
+
+
+def bump_daily_item_sales(store_id, day, lines, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) one bill's lines from the item rollup.
+    lines: iterable of (item_id, category, qty, line_total).
+    """
+    totals = {}
+    _add_item_totals(totals, lines, sign)
+    _bump_item_rollup(store_id, day, totals)
+
+
+def apply_bill_to_rollups(bill, lines, sign=1):
+    """Add or remove a whole bill's contribution (used when it enters/leaves ACTIVE)."""
+    day = bill.created_at.date()
+    bump_daily_sales(bill.store_id, day, sign * bill.total_amount, sign)
+    bump_daily_item_sales(bill.store_id, day, lines, sign)
+
+
+def add_bills_to_rollups(bills):
+    """
+    Add many new ACTIVE bills with one upsert per rollup table, store and day.
+    bills: iterable of (store_id, day, total_amount, lines).
+    """
+    per_day = {}
+    for store_id, day, total_amount, lines in bills:
+        sales, item_totals = per_day.setdefault((store_id, day), ([0.0, 0], {}))
+        sales[0] += total_amount
+        sales[1] += 1
+        _add_item_totals(item_totals, lines)
+
+    for (store_id, day), ((revenue, bill_count), item_totals) in per_day.items():
+        bump_daily_sales(store_id, day, revenue, bill_count)
+        _bump_item_rollup(store_id, day, item_totals)
+
+
+def bill_rollup_lines(bill):
+    return [(bi.item_id, bi.item.category, bi.quantity, bi.line_total) for bi in bill.items if bi.item]
+
+
+def fill_rollups(conn):
+    """Fill the (empty) rollup tables from the full bill history, archived bills included."""
+    bills, lines = bill_entities()
+    day = func.date(bills.created_at)
+    conn.execute(
+        insert(DailySales).from_select(
+            ['store_id', 'day', 'bill_count', 'revenue'],
+            select(bills.store_id, day, func.count(bills.id), func.sum(bills.total_amount))
+            .where(bills.status == 'ACTIVE')
+            .group_by(bills.store_id, day),
+        )
+    )
+    conn.execute(
+        insert(DailyItemSales).from_select(
+            ['store_id', 'day', 'item_id', 'category', 'qty', 'revenue', 'bill_count'],
+            select(bills.store_id, day, lines.item_id, Item.category,
+                   func.sum(lines.quantity), func.sum(lines.line_total),
+                   func.count(func.distinct(bills.id)))
+            .join_from(lines, bills, bills.id == lines.bill_id)
+            .join(Item, Item.id == lines.item_id)
+            .where(bills.status == 'ACTIVE')
+            .group_by(bills.store_id, day, lines.item_id, Item.category),
+        )
+    )
+
+
+def rebuild_rollups():
+    """Recompute both rollup tables from the full bill history (archived bills included)."""
+    db.session.query(DailyItemSales).delete()
+    db.session.query(DailySales).delete()
+    fill_rollups(db.session.connection())
+    db.session.add(ReportTouch(day=date.min))  # every worker drops its cached reports
+    db.session.commit()
+
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute daily sales rollups from existing bills."""
+    rebuild_rollups()
+    print(f"✅ Rebuilt {DailySales.query.count()} daily rows and "
+          f"{DailyItemSales.query.count()} item rows.")
+
+
+# ---------- Bill archive ----------
+# `flask archive-bills --months N` moves bills created before the start of the month
+# N months back (and their lines) into bill_archive / bill_item_archive, one short
+# transaction per batch, so the live tables and their indexes stay the size of recent
+# trading. Rollups are left alone, so report totals don't change. Code that needs bill
+# rows for a period (sales report detail, exports, rebuild-rollups) gets them through
+# bill_entities(), which adds the archive only when the period starts before the newest
+# archive cutoff.
+
+app.config.setdefault('ARCHIVE_POLL_SECONDS', 5)
+ARCHIVE_BATCH_SIZE = 500
+
+_BILL_COLUMNS = [c.name for c in Bill.__table__.c]
+_BILL_ITEM_COLUMNS = [c.name for c in BillItem.__table__.c]
+
+_archive_horizon = {'cutoff': None, 'checked_at': None}
+
+
+def archive_horizon():
+    """Newest archive cutoff (None if nothing was archived); re-read at most every ARCHIVE_POLL_SECONDS."""
+    now = time.monotonic()
+    checked_at = _archive_horizon['checked_at']
+    if checked_at is None or now - checked_at >= app.config['ARCHIVE_POLL_SECONDS']:
+        with primary_reads():  # archive_bills waits ARCHIVE_POLL_SECONDS for every worker to see it
+            _archive_horizon['cutoff'] = db.session.query(func.max(ArchiveRun.cutoff)).scalar()
+        _archive_horizon['checked_at'] = now
+    return _archive_horizon['cutoff']
+
+
+def _live_and_archived(model, archive_model, columns, name):
+    rows = union_all(
+        select(*(model.__table__.c[c] for c in columns)),
+        select(*(archive_model.__table__.c[c] for c in columns)),
+    ).subquery(name)
+    return aliased(model, rows)
+
+
+def bill_entities(start=None):
+    """
+    (Bill, BillItem) entities for reading bills created from `start` (datetime, None for
+    all time) on: the live tables, or aliases over live + archive rows (same ids) when
+    the period reaches into the archive.
+    """
+    horizon = archive_horizon()
+    if horizon is None or (start is not None and start >= horizon):
+        return Bill, BillItem
+    return (_live_and_archived(Bill, ArchivedBill, _BILL_COLUMNS, 'all_bills'),
+            _live_and_archived(BillItem, ArchivedBillItem, _BILL_ITEM_COLUMNS, 'all_bill_items'))
+
+
+def archive_bills(cutoff, batch_size=ARCHIVE_BATCH_SIZE, pause=0.0):
+    """
+    Move bills created before `cutoff` and their lines to the archive tables, oldest first,
+    batch_size bills per transaction. Returns the number of bills moved.
+    """
+    run = ArchiveRun(cutoff=cutoff)
+    db.session.add(run)
+    db.session.commit()
+    # Workers cache the horizon: let them pick up the new cutoff before rows start moving,
+    # so a report never looks only at the live tables for an already archived bill.
+    time.sleep(app.config['ARCHIVE_POLL_SECONDS'])
+
+    moved = 0
+    while True:
+        ids = db.session.execute(
+            select(Bill.id).where(Bill.created_at < cutoff).order_by(Bill.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        db.session.execute(insert(ArchivedBill).from_select(
+            _BILL_COLUMNS, select(*(Bill.__table__.c[c] for c in _BILL_COLUMNS)).where(Bill.id.in_(ids))))
+        db.session.execute(insert(ArchivedBillItem).from_select(
+            _BILL_ITEM_COLUMNS,
+            select(*(BillItem.__table__.c[c] for c in _BILL_ITEM_COLUMNS)).where(BillItem.bill_id.in_(ids))))
+        db.session.execute(delete(BillItem).where(BillItem.bill_id.in_(ids)).execution_options(synchronize_session=False))
+        db.session.execute(delete(Bill).where(Bill.id.in_(ids)).execution_options(synchronize_session=False))
+        moved += len(ids)
+        run.bills_moved = moved
+        db.session.commit()
+
+        if pause:
+            time.sleep(pause)  # give the POS a breather between batches on a busy database
+
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
+    return moved
+
+
+def months_ago_cutoff(months, today=None):
+    """Midnight on the first day of the month `months` months before this one."""
+    today = today or utc_today()
+    index = today.year * 12 + today.month - 1 - months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+@app.cli.command('archive-bills')
+@click.option('--months', type=int, default=12, show_default=True,
+              help='Keep this many whole months (plus the current one) in the live tables.')
+@click.option('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, show_default=True,
+              help='Bills moved per transaction.')
+@click.option('--pause', type=float, default=0.0, show_default=True,
+              help='Seconds to wait between batches.')
+def archive_bills_command(months, batch_size, pause):
+    """Move old bills out of the live tables into the archive tables."""
+    if months < 1:
+        raise click.BadParameter('must be at least 1', param_hint='--months')
+    cutoff = months_ago_cutoff(months)
+    print(f"Archiving bills created before {cutoff:%Y-%m-%d}...")
+    moved = archive_bills(cutoff, batch_size, pause)
+    print(f"✅ Archived {moved} bills.")
+
+
+# ---------- Menu catalog cache ----------
+# The menu only changes through admin_items, so each worker keeps a copy of it.
+# Writers bump CacheVersion('catalog') in the same transaction; workers re-read that
+# single row at most every CATALOG_POLL_SECONDS and reload the menu when it moved.
+
+app.config.setdefault('CATALOG_POLL_SECONDS', float(os.getenv('CATALOG_POLL_SECONDS', '2')))
+
+
+def bump_cache_version(name):
+    stmt = _upsert(CacheVersion).values(name=name, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'version': CacheVersion.version + 1},
+    )
+    db.session.execute(stmt)
+
+
+class CatalogSnapshot:
+    """One version of the menu: /api/items body, its ETag and detached Item rows by id."""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.items = {}
+        payload = []
+        for r in rows:
+            item = Item(id=r.id, product_code=r.product_code, name=r.name, price=r.price, category=r.category)
+            make_transient_to_detached(item)  # can be merged into any session without a SELECT
+            self.items[item.id] = item
+            payload.append({
+                'id': r.id,
+                'code': r.product_code,
+                'name': r.name,
+                'price': r.price,
+                'category': r.category
+            })
+        self.body = app.json.dumps(payload).encode('utf-8')
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+
+
+class CatalogCache:
+    """Process-local menu cache keyed by the catalog version."""
+
+    def __init__(self):
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Force a version check on the next get() (used by the worker that did the write)."""
+        self._checked_at = 0.0
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < app.config['CATALOG_POLL_SECONDS']:
+            return snapshot
+
+        with self._lock, primary_reads():  # the POS prices bills from this snapshot
+            # Read the version before the rows: a concurrent bump then at worst causes a reload.
+            version = db.session.query(CacheVersion.version).filter_by(name='catalog').scalar() or 0
+            if self._snapshot is None or self._snapshot.version != version:
+                rows = db.session.query(
+                    Item.id, Item.product_code, Item.name, Item.price, Item.category
+                ).order_by(Item.category, Item.name).all()
+                self._snapshot = CatalogSnapshot(version, rows)
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+
+catalog = CatalogCache()
+
+
+# ---------- Bill sequence codes ----------
+# Bill numbers come from SeqCounter instead of bill.id, so a bill is inserted with
+# its seq_code in one statement. Each worker reserves SEQ_BLOCK_SIZE numbers at a
+# time in its own short transaction; unused numbers of a block are simply skipped
+# (e.g. on restart), so codes are unique but may have gaps. Every store numbers its
+# bills from its own counter row with its own prefix (IL00042, KR00042), so stores
+# never wait on each other for a number.
+
+app.config.setdefault('SEQ_BLOCK_SIZE', int(os.getenv('SEQ_BLOCK_SIZE', '20')))
+
+
+class SeqCodeAllocator:
+    """Per-process allocator of codes like IL00042 from blocks reserved in SeqCounter."""
+
+    def __init__(self, name, prefix):
+        self.name = name
+        self.prefix = prefix
+        self._next = self._end = 0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _reserve(self, n):
+        """Reserve at least n numbers; committed on a separate connection so they are never reused."""
+        block = max(n, app.config['SEQ_BLOCK_SIZE'])
+        with db.engine.begin() as conn:
+            reserved = conn.execute(
+                update(SeqCounter)
+                .where(SeqCounter.name == self.name)
+                .values(next_value=SeqCounter.next_value + block)
+            ).rowcount
+            if not reserved:
+                raise RuntimeError(f"Sequence counter '{self.name}' is missing; run init_db().")
+            end = conn.execute(select(SeqCounter.next_value).where(SeqCounter.name == self.name)).scalar_one()
+        return end - block, end
+
+    def allocate(self, n=1):
+        """Return n unused codes. Call before the request's own writes start."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked worker must not reuse its parent's block.
+                self._next = self._end = 0
+                self._pid = os.getpid()
+            if self._end - self._next < n:
+                self._next, self._end = self._reserve(n)
+            start = self._next
+            self._next += n
+        return [f"{self.prefix}{value:05d}" for value in range(start, start + n)]
+
+
+DEFAULT_STORE_CODE = 'IL'
+STORE_CODE_RE = re.compile(r'^[A-Z]{2,6}$')  # letters only: a prefix can't be mistaken for digits
+
+_bill_code_allocators = {}
+
+
+def store_counter_name(store_code):
+    return f'bill:{store_code}'
+
+
+def bill_codes(store_code):
+    """This process's allocator of a store's bill codes."""
+    allocator = _bill_code_allocators.get(store_code)
+    if allocator is None:
+        allocator = _bill_code_allocators.setdefault(
+            store_code, SeqCodeAllocator(store_counter_name(store_code), store_code))
+    return allocator
+
+
+# ---------- Group commit ----------
+# With BILL_GROUP_COMMIT=1 api_create_bill doesn't commit by itself: it hands the bill
+# to this worker's BillWriter and waits. The writer thread inserts whatever arrived
+# within BILL_GROUP_COMMIT_MS of the first waiting bill (at most BILL_GROUP_COMMIT_MAX)
+# in one transaction, so a burst of checkouts shares one commit (one fsync on SQLite,
+# one round trip on Postgres) and one rollup upsert per store and day. A request still
+# answers only after its group committed, so every bill a till got back is durable.
+
+app.config.setdefault('BILL_GROUP_COMMIT', os.getenv('BILL_GROUP_COMMIT', '0') == '1')
+app.config.setdefault('BILL_GROUP_COMMIT_MS', float(os.getenv('BILL_GROUP_COMMIT_MS', '5')))
+app.config.setdefault('BILL_GROUP_COMMIT_MAX', 100)
+BILL_WRITER_TIMEOUT = 30  # seconds before a request cancels its bill, unless the writer already took it
+
+
+class PendingBill:
+    """A bill waiting for the writer: column values and lines in, ids (or the error) out."""
+
+    def __init__(self, row, lines):
+        self.row = row  # Bill column values
+        self.lines = lines  # [(item_id, category, qty, line_total)]
+        self.bill_id = None
+        self.line_ids = None
+        self.error = None
+        self.done = threading.Event()
+        self._taken = None  # True once the writer took it, False once the request gave up
+        self._lock = threading.Lock()
+
+    def _settle(self, taken):
+        with self._lock:
+            if self._taken is None:
+                self._taken = taken
+            return self._taken == taken
+
+    def take(self):
+        """For the writer: False if the request already gave up on this bill."""
+        return self._settle(True)
+
+    def cancel(self):
+        """For the request: False if the writer already took the bill, which then gets committed or fails."""
+        return self._settle(False)
+
+
+def _insert_bills(group):
+    """Insert a group of PendingBills with their lines and rollups (caller commits)."""
+    bill_ids = db.session.scalars(
+        insert(Bill).returning(Bill.id, sort_by_parameter_order=True), [p.row for p in group]).all()
+    line_ids = iter(db.session.scalars(
+        insert(BillItem).returning(BillItem.id, sort_by_parameter_order=True),
+        [{'bill_id': bill_id, 'item_id': item_id, 'quantity': qty, 'refunded_qty': 0, 'line_total': line_total}
+         for bill_id, p in zip(bill_ids, group) for item_id, _, qty, line_total in p.lines],
+    ).all())
+    for bill_id, p in zip(bill_ids, group):
+        p.bill_id = bill_id
+        p.line_ids = [next(line_ids) for _ in p.lines]
+    add_bills_to_rollups((p.row['store_id'], p.row['created_at'].date(), p.row['total_amount'], p.lines)
+                         for p in group)
+
+
+class BillWriter:
+    """Per-process writer thread that commits queued bills in groups."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, pending):
+        """Queue a PendingBill and wait until it is committed; re-raises the writer's error."""
+        self._ensure_started()
+        self._queue.put(pending)
+        if not pending.done.wait(BILL_WRITER_TIMEOUT):
+            if pending.cancel():
+                raise RuntimeError('Bill writer did not commit in time')  # and never will
+            pending.done.wait()  # its group is being written: report what happened to it
+        if pending.error is not None:
+            raise pending.error
+        return pending
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Threads don't survive fork: each gunicorn worker starts its own writer.
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, args=(self._queue,), name='bill-writer', daemon=True).start()
+
+    def _run(self, pending_bills):
+        while True:
+            group = [pending_bills.get()]
+            deadline = time.monotonic() + app.config['BILL_GROUP_COMMIT_MS'] / 1000
+            while len(group) < app.config['BILL_GROUP_COMMIT_MAX']:
+                try:
+                    group.append(pending_bills.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            group = [pending for pending in group if pending.take()]
+            try:
+                if group:
+                    self._commit(group)
+            except Exception as e:
+                # Never leave a request waiting, nor the thread dead for the rest of the process
+                app.logger.exception('Bill writer failed on a group of %d bills', len(group))
+                for pending in group:
+                    if not pending.done.is_set():
+                        pending.error = e
+                        pending.done.set()
+
+    def _commit(self, group):
+        try:
+            with app.app_context():
+                begin_write()
+                _insert_bills(group)
+                db.session.commit()
+        except Exception as e:
+            if len(group) > 1:
+                for pending in group:
+                    self._commit([pending])  # one at a time, so only the bad bill fails
+                return
+            group[0].error = e
+        else:
+            try:
+                metrics.record_group_commit(len(group))
+                report_cache.invalidate_days({p.row['created_at'].date() for p in group})
+            except Exception:
+                app.logger.exception('Bill writer bookkeeping failed')  # the bills are committed all the same
+        for pending in group:
+            pending.done.set()
+
+
+bill_writer = BillWriter()
+
+
+def commit_bill_grouped(bill, data):
+    """
+    Commit a new, not yet added Bill (built with its items) through the group writer.
+    data is serialize_bill(bill) made beforehand; its ids are filled in once committed.
+    """
+    pending = PendingBill(
+        {'seq_code': bill.seq_code, 'created_at': bill.created_at, 'customer_name': bill.customer_name,
+         'total_amount': bill.total_amount, 'status': bill.status, 'user_id': bill.user.id if bill.user else None,
+         'store_id': bill.store_id, 'terminal_id': bill.terminal_id},
+        [(bi.item.id, bi.item.category, bi.quantity, bi.line_total) for bi in bill.items],
+    )
+    db.session.close()  # give the connection back to the pool while waiting
+    bill_writer.submit(pending)
+    data['bill_id'] = pending.bill_id
+    for line, line_id in zip(data['items'], pending.line_ids):
+        line['bill_item_id'] = line_id
+    return data
+
+
+# ---------- Report cache ----------
+# Report JSON is cached per worker, keyed by (endpoint, params, period), with LRU
+# eviction and a TTL. Every entry knows the day range it covers; bump_daily_sales()
+# marks the days a write changed and, once the request is done, only entries
+# covering those days are dropped. Days before today are also logged in
+# ReportTouch so other workers drop their copies on their next poll. Periods that
+# include today are not logged (every sale would write a row) and rely on a short
+# TTL in other workers instead.
+
+app.config.setdefault('REPORT_CACHE_SIZE', 256)
+app.config.setdefault('REPORT_CACHE_OPEN_TTL', 30)  # seconds, periods that include today
+app.config.setdefault('REPORT_CACHE_CLOSED_TTL', 24 * 3600)  # seconds, periods fully in the past
+app.config.setdefault('REPORT_CACHE_POLL_SECONDS', 2)
+
+
+def utc_today():
+    # Bill days (rollups, report periods) are UTC dates of Bill.created_at.
+    return datetime.utcnow().date()
+
+
+def touch_report_day(day):
+    """Record that this request changed the numbers of `day` (call inside the write transaction)."""
+    if has_request_context():
+        g.setdefault('report_days_touched', set()).add(day)
+    if day < utc_today():
+        db.session.add(ReportTouch(day=day))
+        # Workers poll every few seconds, so a day of history is plenty.
+        db.session.execute(delete(ReportTouch).where(ReportTouch.touched_at < datetime.utcnow() - timedelta(days=1)))
+
+
+class ReportCache:
+    """Process-local LRU/TTL cache of report bodies with day-precise invalidation."""
+
+    def __init__(self):
+        self._entries = OrderedDict()  # key -> (body, etag, start_day, end_day, expires_at)
+        self._invalidated_at = {}  # day -> monotonic time of its last invalidation
+        self._lock = threading.Lock()
+        self._last_touch_id = None
+        self._checked_at = 0.0
+        self.hits = self.misses = self.invalidations = 0
+
+    def get(self, key):
+        self._poll_touches()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[4] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, start_day, end_day, ttl):
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            self._entries[key] = (body, etag, start_day, end_day, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > app.config['REPORT_CACHE_SIZE']:
+                self._entries.popitem(last=False)
+        return etag
+
+    def invalidate_days(self, days):
+        """
+        Drop entries whose period contains any of `days` (unbounded periods contain every day).
+        date.min stands for "every day" (logged by rebuild_rollups).
+        """
+        now = time.monotonic()
+        with self._lock:
+            for day in days:
+                self._invalidated_at[day] = now
+            horizon = now - app.config['REPORTING_MAX_LAG_SECONDS']
+            self._invalidated_at = {d: t for d, t in self._invalidated_at.items() if t >= horizon}
+            stale = [
+                key for key, (_, _, start, end, _) in self._entries.items()
+                if date.min in days
+                or any((start is None or start <= d) and (end is None or d < end) for d in days)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def replica_ttl(self, start_day, end_day, ttl):
+        """
+        TTL for a body read from the reporting replica. If a day of its period changed in
+        the last REPORTING_MAX_LAG_SECONDS, the replica may not have that change yet, so
+        the entry lives only until the replica must have caught up.
+        """
+        now = time.monotonic()
+        with self._lock:
+            changed = [t for d, t in self._invalidated_at.items()
+                       if d == date.min or ((start_day is None or start_day <= d) and (end_day is None or d < end_day))]
+        if not changed:
+            return ttl
+        return min(ttl, max(max(changed) + app.config['REPORTING_MAX_LAG_SECONDS'] - now, 0))
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'invalidations': self.invalidations}
+
+    def _poll_touches(self):
+        """Apply past-day changes logged by other workers (one small PK range query)."""
+        if time.monotonic() - self._checked_at < app.config['REPORT_CACHE_POLL_SECONDS']:
+            return
+        with self._lock:
+            last_id = self._last_touch_id
+        with primary_reads():
+            if last_id is None:
+                # Nothing is cached yet, so only changes from now on matter.
+                last_id = db.session.query(func.max(ReportTouch.id)).scalar() or 0
+                days = set()
+            else:
+                rows = db.session.query(ReportTouch.id, ReportTouch.day).filter(ReportTouch.id > last_id).all()
+                days = {r.day for r in rows}
+                last_id = max([last_id] + [r.id for r in rows])
+        if days:
+            self.invalidate_days(days)
+        with self._lock:
+            self._last_touch_id = last_id
+            self._checked_at = time.monotonic()
+
+
+report_cache = ReportCache()
+
+
+@app.after_request
+def invalidate_touched_reports(response):
+    # After the view's commit, so a concurrent request can't re-cache the old numbers.
+    days = g.pop('report_days_touched', None)
+    if days:
+        report_cache.invalidate_days(days)
+    return response
+
+
+def cached_report(period):
+    """
+    Cache a report view's JSON. period(args) -> (start_day, end_day) half-open,
+    None for an open end; raising ValueError means "don't cache" (the view reports the error).
+    Responses carry an ETag and answer If-None-Match with 304.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(*args, **kwargs):
+            try:
+                start_day, end_day = period(request.args)
+            except (ValueError, IndexError):
+                return view_func(*args, **kwargs)
+
+            today = utc_today()
+            closed = end_day is not None and end_day <= today
+            key = (request.endpoint, tuple(sorted(request.args.items(multi=True))), start_day, end_day,
+                   None if closed else today)
+
+            entry = report_cache.get(key)
+            if entry is not None:
+                body, etag = entry[0], entry[1]
+            else:
+                response = app.make_response(view_func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                ttl = app.config['REPORT_CACHE_CLOSED_TTL' if closed else 'REPORT_CACHE_OPEN_TTL']
+                if g.get('reporting_reads') and REPORTING_BIND in db.engines:
+                    ttl = report_cache.replica_ttl(start_day, end_day, ttl)
+                etag = report_cache.put(key, body, start_day, end_day, ttl)
+
+            response = app.response_class(body, mimetype='application/json')
+            response.set_etag(etag)
+            # Past periods only change on a late refund/cancel: let the browser reuse them for a while.
+            response.headers['Cache-Control'] = 'private, max-age=300' if closed else 'private, no-cache'
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+def _sales_report_period(args):
+    return report_period(args.get('type', 'daily'), args.get('date', str(utc_today())))
+
+
+def _items_report_period(args):
+    try:
+        start = datetime.strptime(args.get('start', ''), '%Y-%m-%d').date()
+        end = datetime.strptime(args.get('end', ''), '%Y-%m-%d').date() + timedelta(days=1)
+        return start, end
+    except ValueError:
+        return None, None  # the view ignores a bad range as well and reports all time
+
+
+def _analysis_report_period(args):
+    return None, None  # all-time category split + trend up to today
+
+
+# ---------- Cart pricing ----------
+
+def parse_cart_lines(items_data):
+    """
+    [(item_id, qty)] from a cart's items payload, skipping unknown item ids and empty
+    lines. Raises ValueError when the payload is not a list of objects with numeric qty.
+    """
+    if not isinstance(items_data, list):
+        raise ValueError('Invalid items')
+    lines = []
+    for entry in items_data:
+        if not isinstance(entry, dict):
+            raise ValueError('Invalid items')
+        try:
+            item_id = int(entry.get('item_id'))
+        except (TypeError, ValueError):
+            continue
+        try:
+            qty = int(entry.get('qty', 0))
+        except (TypeError, ValueError):
+            raise ValueError('Invalid qty')
+        if qty <= 0:
+            continue
+        lines.append((item_id, qty))
+    return lines
+
+
+def load_cart_items(item_ids):
+    """{id: Item} attached to the session: catalog cache first, one IN query for the rest."""
+    snapshot = catalog.get()
+    missing = {item_id for item_id in item_ids if item_id not in snapshot.items}
+    items = {i.id: i for i in Item.query.filter(Item.id.in_(missing))} if missing else {}
+    for item_id in item_ids:
+        if item_id in snapshot.items:
+            items[item_id] = db.session.merge(snapshot.items[item_id], load=False)
+    return items
+
+
+def price_cart(lines, items):
+    """Return ([(item, qty, line_total)], total); lines for unknown items are dropped."""
+    total = 0.0
+    bill_items = []
+    for item_id, qty in lines:
+        item = items.get(item_id)
+        if not item:
+            continue
+        line_total = item.price * qty
+        total += line_total
+        bill_items.append((item, qty, line_total))
+    return bill_items, total
+
+
+# ---------- Static assets ----------
+# `python assets.py` (run before gunicorn, see Procfile) writes content-hashed copies of
+# static/ with .br/.gz siblings. url_for('static', ...) then points at the hashed copy,
+# which never changes, so browsers and the service worker keep it for a year. Without a
+# build the plain files are served with revalidation, as Flask does by default.
+
+CHART_JS_URL = 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js'  # pinned: cacheable
+app.jinja_env.globals['CHART_JS_URL'] = CHART_JS_URL
+
+static_manifest = assets.load_manifest(app.static_folder)
+
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    if endpoint == 'static' and values.get('filename') in static_manifest['assets']:
+        values['filename'] = static_manifest['assets'][values['filename']]
+
+
+def send_static_asset(filename):
+    """The static view: built assets are immutable and sent precompressed when accepted."""
+    encodings = static_manifest['encodings'].get(filename)
+    if encodings is None:
+        return app.send_static_file(filename)
+
+    for encoding in encodings:
+        if request.accept_encodings.quality(encoding) > 0:
+            response = send_from_directory(app.static_folder, filename + assets.SUFFIXES[encoding],
+                                           mimetype=mimetypes.guess_type(filename)[0], max_age=365 * 86400)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(app.static_folder, filename, max_age=365 * 86400)
+    response.cache_control.immutable = True
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+app.view_functions['static'] = send_static_asset
+
+
+@app.route('/sw.js')
+def service_worker():
+    """The POS service worker; served from the root so its scope covers /pos and /api/items."""
+    precache = [url_for('static', filename=name) for name in ('style.css', 'script.js', 'logo.png')
+                if name in static_manifest['assets']]
+    body = render_template(
+        'sw.js',
+        version=hashlib.sha256('\n'.join(precache).encode('utf-8')).hexdigest()[:12],
+        precache=precache,
+        immutable_prefix=f"{app.static_url_path}/{assets.DIST}/",
+        immutable_urls=[CHART_JS_URL],
+        shell=[url_for('pos'), url_for('api_items')],
+        sign_out=[url_for('login'), url_for('logout')],
+    )
+    response = app.response_class(body, mimetype='text/javascript')
+    response.headers['Cache-Control'] = 'no-cache'  # browsers check for a new worker on every load
+    return response
+
+
+# ---------- Response compression ----------
+# JSON, HTML and CSV bodies of at least COMPRESS_MIN_BYTES are sent with brotli (if
+# installed) or gzip, whichever the browser accepts; a year of sales is a few hundred
+# KB of JSON but compresses ~10x. Streamed responses (exports, which have ?gzip=1),
+# files and the precompressed static assets are left alone. Report bodies are cached
+# uncompressed, so the cache serves every client.
+
+app.config.setdefault('COMPRESS_MIN_BYTES', int(os.getenv('COMPRESS_MIN_BYTES', '1024')))
+COMPRESS_MIMETYPES = {'application/json', 'text/html', 'text/csv', 'text/javascript'}
+COMPRESS_LEVEL = {'gzip': 6, 'br': 5}  # fast levels: this runs per response
+
+
+def compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_LEVEL['br'])
+    return zlib.compress(data, COMPRESS_LEVEL['gzip'], wbits=31)  # 31 = gzip container
+
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code < 200 or response.status_code >= 300 or response.status_code in (204, 206)
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or (response.content_length or 0) < app.config['COMPRESS_MIN_BYTES']):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli is not None else ['gzip'])
+    if encoding is None:
+        return response
+
+    response.set_data(compress_body(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)  # same content, different bytes
+    return response
+
+
 # ---------- Routes ----------
 
+TERMINAL_COOKIE_MAX_AGE = 365 * 86400
+
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
+    # Tills to pick from; the browser remembers its till in a cookie
+    terminals = Terminal.query.options(joinedload(Terminal.store)).order_by(Terminal.store_id, Terminal.name).all()
+    selected = request.form.get('terminal') or request.cookies.get('terminal') or ''
+    render = lambda error=None: render_template('login.html', error=error, terminals=terminals, selected=selected)
+
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '').strip()
         user = User.query.filter_by(username=username).first()
         if user and user.check_password(password):
-            session['user_id'] = user.id
-            return redirect(url_for('pos'))
-        return render_template('login.html', error='Invalid username or password')
-    return render_template('login.html')
+            terminal = next((t for t in terminals if str(t.id) == request.form.get('terminal')), None)
+            if terminal and user.store_id and terminal.store_id != user.store_id:
+                return render('This till belongs to another store')
+            start_user_session(user, terminal)
+            response = redirect(url_for('pos'))
+            if terminal:
+                response.set_cookie('terminal', str(terminal.id), max_age=TERMINAL_COOKIE_MAX_AGE,
+                                    httponly=True, samesite='Lax')
+            return response
+        return render('Invalid username or password')
+    return render()
 
 
 @app.route('/logout')
@@ -291,71 +2130,116 @@ def pos():
 
 @app.route('/admin/reports')
 @admin_required
+@reads_from_reporting
 def admin_reports():
     """New Advanced Reporting Dashboard."""
     user = get_current_user()
-    return render_template('report.html', user=user, today=date.today())
+    stores = Store.query.order_by(Store.id).all()
+    return render_template('report.html', user=user, today=utc_today(), stores=stores)
+
+
+REPORT_PAGE_SIZE = 100
+REPORT_PAGE_MAX = 500
 
 
 @app.route('/api/reports/sales')
 @admin_required
+@reads_from_reporting
+@cached_report(_sales_report_period)
+@query_budget(4)  # report cache poll, archive horizon poll, days, bills page
 def api_report_sales():
     """
     Get sales data for a specific range.
-    query params: type=daily|monthly|yearly, date=YYYY-MM-DD (or YYYY-MM or YYYY)
+    query params: type=daily|monthly|yearly, date=YYYY-MM-DD (or YYYY-MM or YYYY),
+                  store (store id, default all stores),
+                  detail=page|none, cursor (next_cursor of the previous page), limit
+    Totals and the per-day (and, for yearly, per-month) breakdown come from the daily
+    rollup; detail=page adds one page of the period's ACTIVE bills, oldest first.
     """
     rtype = request.args.get('type', 'daily')
-    date_str = request.args.get('date', str(date.today()))
+    date_str = request.args.get('date', str(utc_today()))
+    detail = request.args.get('detail', 'page')
 
-    query = Bill.query.filter(Bill.status == 'ACTIVE')
+    if detail not in ('page', 'none'):
+        return jsonify({'error': 'detail must be page or none'}), 400
 
     try:
-        if rtype == 'daily':
-            # Format: YYYY-MM-DD
-            target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            start = datetime(target_date.year, target_date.month, target_date.day)
-            end = datetime(target_date.year, target_date.month, target_date.day, 23, 59, 59)
-            query = query.filter(Bill.created_at >= start, Bill.created_at <= end)
-
-        elif rtype == 'monthly':
-            # Format: YYYY-MM
-            parts = date_str.split('-')
-            year, month = int(parts[0]), int(parts[1])
-            query = query.filter(extract('year', Bill.created_at) == year,
-                                 extract('month', Bill.created_at) == month)
-
-        elif rtype == 'yearly':
-            # Format: YYYY
-            year = int(date_str)
-            query = query.filter(extract('year', Bill.created_at) == year)
-
-    except ValueError:
+        start_day, end_day = report_period(rtype, date_str)
+    except (ValueError, IndexError):
         return jsonify({'error': 'Invalid date format'}), 400
-
-    bills = query.order_by(Bill.created_at).all()
-
-    # Aggregate Data
-    total_sales = sum(b.total_amount for b in bills)
-    bill_count = len(bills)
-
-    # Serialize for table
-    bills_data = [{
-        'id': b.id,
-        'seq_code': b.seq_code,
-        'time': b.created_at.isoformat(),
-        'total': b.total_amount,
-        'staff': b.user.username if b.user else '-'
-    } for b in bills]
-
-    return jsonify({
+    try:
+        store = _parse_arg(request.args, 'store', int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Aggregate Data (one rollup row per store and day, not the bill rows)
+    days_query = db.session.query(DailySales.day, func.sum(DailySales.bill_count).label('bill_count'),
+                                  func.sum(DailySales.revenue).label('revenue'))
+    if store is not None:
+        days_query = days_query.filter(DailySales.store_id == store)
+    if start_day:
+        days_query = days_query.filter(DailySales.day >= start_day, DailySales.day < end_day)
+    days = days_query.group_by(DailySales.day).having(func.sum(DailySales.bill_count) != 0) \
+        .order_by(DailySales.day).all()
+
+    total_sales = sum(d.revenue for d in days)
+    bill_count = sum(d.bill_count for d in days)
+
+    result = {
         'total_sales': total_sales,
         'bill_count': bill_count,
-        'bills': bills_data
-    })
+        'days': [{'date': str(d.day), 'bill_count': d.bill_count, 'total': d.revenue} for d in days],
+    }
+
+    if rtype == 'yearly':
+        months = {}
+        for d in days:
+            month = months.setdefault(d.day.strftime('%Y-%m'), {'bill_count': 0, 'total': 0.0})
+            month['bill_count'] += d.bill_count
+            month['total'] += d.revenue
+        result['months'] = [{'month': m, **v} for m, v in months.items()]
+
+    if detail == 'page':
+        period_start = datetime.combine(start_day, datetime.min.time()) if start_day else None
+        bills_table, _ = bill_entities(period_start)  # old periods also read the archive
+        query = db.session.query(bills_table).options(joinedload(bills_table.user)) \
+            .filter(bills_table.status == 'ACTIVE')
+        if store is not None:
+            query = query.filter(bills_table.store_id == store)
+        if start_day:
+            # Half-open range on the raw column so (status, created_at) index can be used
+            query = query.filter(bills_table.created_at >= period_start,
+                                 bills_table.created_at < datetime.combine(end_day, datetime.min.time()))
+
+        try:
+            limit = min(max(_parse_arg(request.args, 'limit', int) or REPORT_PAGE_SIZE, 1), REPORT_PAGE_MAX)
+            cursor = (request.args.get('cursor') or '').strip()
+            if cursor:
+                c_at, c_id = decode_bill_cursor(cursor)
+                query = query.filter(bills_table.created_at >= c_at,
+                                     or_(bills_table.created_at > c_at, bills_table.id > c_id))
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({'error': 'Invalid cursor or limit'}), 400
+
+        bills = query.order_by(bills_table.created_at, bills_table.id).limit(limit + 1).all()
+        result['next_cursor'] = encode_bill_cursor(bills[limit - 1]) if len(bills) > limit else None
+
+        # Serialize for table
+        result['bills'] = [{
+            'id': b.id,
+            'seq_code': b.seq_code,
+            'time': b.created_at.isoformat(),
+            'total': b.total_amount,
+            'staff': b.user.username if b.user else '-'
+        } for b in bills[:limit]]
+
+    return jsonify(result)
 
 
 @app.route('/api/reports/items')
 @admin_required
+@reads_from_reporting
+@cached_report(_items_report_period)
 def api_report_items():
     """Item-wise sales analysis."""
     # filtering by date range optional, for now return all-time or last 30 days
@@ -367,21 +2251,27 @@ def api_report_items():
         Item.name,
         Item.product_code,
         Item.category,
-        func.sum(BillItem.quantity).label('total_qty'),
-        func.sum(BillItem.line_total).label('total_revenue')
-    ).join(BillItem, Item.id == BillItem.item_id).join(Bill, Bill.id == BillItem.bill_id)
-
-    query = query.filter(Bill.status == 'ACTIVE')
+        func.sum(DailyItemSales.qty).label('total_qty'),
+        func.sum(DailyItemSales.revenue).label('total_revenue')
+    ).join(DailyItemSales, Item.id == DailyItemSales.item_id)
 
     if start_str and end_str:
         try:
-            s_date = datetime.strptime(start_str, '%Y-%m-%d')
-            e_date = datetime.strptime(end_str, '%Y-%m-%d') + timedelta(days=1)
-            query = query.filter(Bill.created_at >= s_date, Bill.created_at < e_date)
+            s_date = datetime.strptime(start_str, '%Y-%m-%d').date()
+            e_date = datetime.strptime(end_str, '%Y-%m-%d').date() + timedelta(days=1)
+            query = query.filter(DailyItemSales.day >= s_date, DailyItemSales.day < e_date)
         except ValueError:
             pass
 
-    results = query.group_by(Item.id).order_by(func.sum(BillItem.quantity).desc()).all()
+    try:
+        store = _parse_arg(request.args, 'store', int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if store is not None:
+        query = query.filter(DailyItemSales.store_id == store)
+
+    results = query.group_by(Item.id).having(func.sum(DailyItemSales.bill_count) > 0) \
+        .order_by(func.sum(DailyItemSales.qty).desc()).all()
 
     data = [{
         'name': r.name,
@@ -396,25 +2286,37 @@ def api_report_items():
 
 @app.route('/api/reports/analysis')
 @admin_required
+@reads_from_reporting
+@cached_report(_analysis_report_period)
 def api_report_analysis():
-    """Analytics for charts."""
+    """Analytics for charts. query params: store (store id, default all stores)"""
+    try:
+        store = _parse_arg(request.args, 'store', int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     # 1. Category Split
     cat_query = db.session.query(
-        Item.category,
-        func.sum(BillItem.line_total)
-    ).join(BillItem).join(Bill).filter(Bill.status == 'ACTIVE').group_by(Item.category).all()
+        DailyItemSales.category,
+        func.sum(DailyItemSales.revenue)
+    )
+    if store is not None:
+        cat_query = cat_query.filter(DailyItemSales.store_id == store)
+    cat_query = cat_query.group_by(DailyItemSales.category).having(func.sum(DailyItemSales.bill_count) > 0).all()
 
     cat_data = {c[0]: c[1] for c in cat_query}
 
     # 2. Last 7 Days Trend
-    today = date.today()
+    today = utc_today()
     seven_days_ago = today - timedelta(days=6)
-    start_dt = datetime.combine(seven_days_ago, datetime.min.time())
 
     trend_query = db.session.query(
-        func.date(Bill.created_at),
-        func.sum(Bill.total_amount)
-    ).filter(Bill.status == 'ACTIVE', Bill.created_at >= start_dt).group_by(func.date(Bill.created_at)).all()
+        DailySales.day,
+        func.sum(DailySales.revenue)
+    ).filter(DailySales.day >= seven_days_ago)
+    if store is not None:
+        trend_query = trend_query.filter(DailySales.store_id == store)
+    trend_query = trend_query.group_by(DailySales.day).all()
 
     # Fill missing dates with 0
     trend_dict = {str(r[0]): r[1] for r in trend_query}
@@ -433,26 +2335,280 @@ def api_report_analysis():
     })
 
 
+
+# ---------- Analytics reports ----------
+# Each report pulls its period with one query, as columns, and hands them to
+# analytics.py (NumPy group-bys when available). Periods use the same type/date/store
+# params as /api/reports/sales and read the archive when they reach into it.
+
+def _epoch_seconds(column):
+    """Unix seconds of a (naive UTC) DateTime column, computed by the database."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return cast(func.extract('epoch', column), db.BigInteger)
+    return cast(func.strftime('%s', column), db.Integer)
+
+
+def _period_bills(args, build_stmt):
+    """
+    Columns of build_stmt(bills, lines) for the period's ACTIVE bills (of one store with
+    store=<id>), as one tuple per column. Raises ValueError on a bad period or store.
+    """
+    start_day, end_day = _sales_report_period(args)
+    store = _parse_arg(args, 'store', int)
+    start = datetime.combine(start_day, datetime.min.time()) if start_day else None
+    bills, lines = bill_entities(start)
+    stmt = build_stmt(bills, lines).where(bills.status == 'ACTIVE')
+    if store is not None:
+        stmt = stmt.where(bills.store_id == store)
+    if start_day:
+        stmt = stmt.where(bills.created_at >= start,
+                          bills.created_at < datetime.combine(end_day, datetime.min.time()))
+    result = db.session.connection(bind_arguments={'clause': stmt}).execute(stmt)
+    try:
+        # Straight from the DBAPI cursor: the columns are ints/floats with nothing to
+        # convert, and skipping Row objects matters for a year of bills.
+        rows = result.cursor.fetchall()
+    finally:
+        result.close()
+    return tuple(zip(*rows)) if rows else ((),) * len(stmt.selected_columns)
+
+
+@app.route('/api/reports/heatmap')
+@admin_required
+@reads_from_reporting
+@cached_report(_sales_report_period)
+@query_budget(3)  # report cache poll, archive horizon poll, bills
+def api_report_heatmap():
+    """
+    Revenue and bill count by weekday x hour of day.
+    query params: type/date/store as /api/reports/sales, utc_offset (shop's minutes east of UTC, e.g. 330)
+    """
+    try:
+        utc_offset = _parse_arg(request.args, 'utc_offset', int) or 0
+        created, amounts = _period_bills(request.args, lambda bills, lines: select(
+            _epoch_seconds(bills.created_at), bills.total_amount))
+    except (ValueError, IndexError):
+        return jsonify({'error': 'Invalid date, store or utc_offset'}), 400
+    return jsonify(analytics.revenue_heatmap(created, amounts, utc_offset))
+
+
+@app.route('/api/reports/staff')
+@admin_required
+@reads_from_reporting
+@cached_report(_sales_report_period)
+@query_budget(3)  # report cache poll, archive horizon poll, bills
+def api_report_staff():
+    """
+    Per cashier: bills, revenue, average ticket and bills per active hour (clock hours
+    in which they rang up at least one bill). query params: type/date/store as /api/reports/sales
+    """
+    try:
+        user_ids, created, amounts, names = _period_bills(request.args, lambda bills, lines: select(
+            bills.user_id, _epoch_seconds(bills.created_at), bills.total_amount, User.username
+        ).outerjoin(User, User.id == bills.user_id))
+    except (ValueError, IndexError):
+        return jsonify({'error': 'Invalid date or store'}), 400
+
+    usernames = dict(zip(user_ids, names))
+    staff = analytics.staff_performance(user_ids, created, amounts)
+    for s in staff:
+        s['staff'] = usernames.get(s['user_id']) or '-'
+    return jsonify(staff)
+
+
+@app.route('/api/reports/basket')
+@admin_required
+@reads_from_reporting
+@cached_report(_sales_report_period)
+@query_budget(4)  # report cache poll, archive horizon poll, bill lines, catalog poll
+def api_report_basket():
+    """
+    "Often bought together": item pairs sharing a bill, most frequent first.
+    query params: type/date/store as /api/reports/sales, min_count (default 3), limit (default 20, max 100)
+    """
+    try:
+        min_count = max(_parse_arg(request.args, 'min_count', int) or 3, 1)
+        limit = min(max(_parse_arg(request.args, 'limit', int) or 20, 1), 100)
+        bill_ids, item_ids = _period_bills(request.args, lambda bills, lines: select(
+            lines.bill_id, lines.item_id).join(bills, bills.id == lines.bill_id))
+    except (ValueError, IndexError):
+        return jsonify({'error': 'Invalid date, store, min_count or limit'}), 400
+
+    n_bills, pairs = analytics.item_pairs(bill_ids, item_ids, min_count, limit)
+    items = catalog.get().items
+    label = lambda item_id: items[item_id].name if item_id in items else f'#{item_id}'
+    return jsonify({
+        'bills': n_bills,
+        'pairs': [{**p, 'items': [{'id': i, 'name': label(i)} for i in p['items']]} for p in pairs],
+    })
+
+
+# ---------- Bill search ----------
+# Newest-first keyset pagination on (created_at, id): a page is "rows before the
+# last one shown", so any page costs the same as the first one.
+
+BILL_PAGE_SIZE = 50
+BILL_PAGE_MAX = 200
+
+
+def encode_bill_cursor(bill):
+    raw = f"{bill.created_at.isoformat()}|{bill.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_bill_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    created_at, bill_id = raw.split('|')
+    return datetime.fromisoformat(created_at), int(bill_id)
+
+
+def _parse_arg(args, name, cast):
+    value = (args.get(name) or '').strip()
+    if not value:
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f'Invalid {name}')
+
+
+def search_bills(args):
+    """
+    Filtered, keyset-paginated bill search shared by the bills page and /api/bills/search.
+    args (all optional): q (seq_code prefix), date_from / date_to (YYYY-MM-DD, inclusive),
+    status, store (store id), staff (user id), amount_min / amount_max, customer (name contains),
+    cursor (from a previous page), limit.
+    Archived bills are included when date_from reaches into the archive (or is not given).
+    Returns (bills, next_cursor). Raises ValueError for malformed filters.
+    """
+    date_from = _parse_arg(args, 'date_from', lambda v: datetime.strptime(v, '%Y-%m-%d'))
+    bills, _ = bill_entities(date_from)
+    query = db.session.query(bills).options(joinedload(bills.user))
+
+    q = (args.get('q') or '').strip().upper()
+    if q:
+        # Prefix as a range so the plain seq_code index is usable on every database
+        query = query.filter(bills.seq_code >= q, bills.seq_code < q[:-1] + chr(ord(q[-1]) + 1))
+
+    if date_from:
+        query = query.filter(bills.created_at >= date_from)
+    date_to = _parse_arg(args, 'date_to', lambda v: datetime.strptime(v, '%Y-%m-%d'))
+    if date_to:
+        query = query.filter(bills.created_at < date_to + timedelta(days=1))
+
+    status = (args.get('status') or '').strip().upper()
+    if status:
+        if status not in ('ACTIVE', 'REFUNDED', 'CANCELLED'):
+            raise ValueError('Invalid status')
+        query = query.filter(bills.status == status)
+
+    store = _parse_arg(args, 'store', int)
+    if store is not None:
+        query = query.filter(bills.store_id == store)
+
+    staff = _parse_arg(args, 'staff', int)
+    if staff is not None:
+        query = query.filter(bills.user_id == staff)
+
+    amount_min = _parse_arg(args, 'amount_min', float)
+    if amount_min is not None:
+        query = query.filter(bills.total_amount >= amount_min)
+    amount_max = _parse_arg(args, 'amount_max', float)
+    if amount_max is not None:
+        query = query.filter(bills.total_amount <= amount_max)
+
+    customer = (args.get('customer') or '').strip().lower()
+    if customer:
+        query = query.filter(func.lower(bills.customer_name).contains(customer, autoescape=True))
+
+    cursor = (args.get('cursor') or '').strip()
+    if cursor:
+        try:
+            c_at, c_id = decode_bill_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError('Invalid cursor')
+        # (created_at, id) < (c_at, c_id), written so the created_at index bounds the scan
+        query = query.filter(bills.created_at <= c_at,
+                             or_(bills.created_at < c_at, bills.id < c_id))
+
+    limit = min(max(_parse_arg(args, 'limit', int) or BILL_PAGE_SIZE, 1), BILL_PAGE_MAX)
+    rows = query.order_by(bills.created_at.desc(), bills.id.desc()).limit(limit + 1).all()
+
+    next_cursor = encode_bill_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
 @app.route('/admin/bills')
 @admin_required
+@reads_from_reporting
+@query_budget(5)  # staff, stores, archive horizon poll, bills page (+ session check)
 def admin_bills_list():
-    """Simple search/list page for old bills."""
+    """Search/list page for old bills."""
     user = get_current_user()
-    q = (request.args.get('q') or '').strip().upper()
+    staff_users = User.query.order_by(User.username).all()
+    stores = Store.query.order_by(Store.id).all()
+    try:
+        bills, next_cursor = search_bills(request.args)
+        error = None
+    except ValueError as e:
+        bills, next_cursor, error = [], None, str(e) or 'Invalid filter'
 
-    query = Bill.query.order_by(Bill.created_at.desc())
-    if q:
-        query = query.filter(Bill.seq_code == q)
+    filters = {k: v for k, v in request.args.items() if k != 'cursor'}
+    return render_template('bills.html', user=user, bills=bills, next_cursor=next_cursor,
+                           filters=filters, staff_users=staff_users, stores=stores, error=error)
+
+
+@app.route('/api/reports/cache_stats')
+@admin_required
+def api_report_cache_stats():
+    """Hit/miss counters of this worker's report cache."""
+    return jsonify(report_cache.stats())
 
-    bills = query.limit(50).all()
-    return render_template('bills.html', user=user, bills=bills, q=q)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target: admin session, or `Authorization: Bearer <METRICS_TOKEN>`."""
+    token = app.config['METRICS_TOKEN']
+    if not (token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')):
+        user = get_current_user()
+        if not user or user.role != 'admin':
+            return "Forbidden: admin only", 403
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/bills/search')
+@admin_required
+@reads_from_reporting
+@query_budget(3)  # archive horizon poll, bills page
+def api_search_bills():
+    """JSON version of the bills page: same filters, {"bills": [...], "next_cursor": ...}."""
+    try:
+        bills, next_cursor = search_bills(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e) or 'Invalid filter'}), 400
+
+    return jsonify({
+        'bills': [{
+            'id': b.id,
+            'seq_code': b.seq_code,
+            'created_at': b.created_at.isoformat() + 'Z',
+            'customer_name': b.customer_name,
+            'total_amount': b.total_amount,
+            'status': b.status,
+            'staff': b.user.username if b.user else None,
+        } for b in bills],
+        'next_cursor': next_cursor,
+    })
 
 
 @app.route('/admin/bills/<int:bill_id>')
 @admin_required
+@query_budget(5)  # bill, lines; archived: live miss, archive horizon poll, bill, lines
 def admin_bill_detail(bill_id):
     user = get_current_user()
-    bill = Bill.query.get_or_404(bill_id)
+    bill = find_bill(Bill.query, id=bill_id)
+    if bill is None:
+        abort(404)
 
     # compute remaining qty for each item
     items_with_remaining = []
@@ -460,7 +2616,122 @@ def admin_bill_detail(bill_id):
         remaining = bi.quantity - (bi.refunded_qty or 0)
         items_with_remaining.append((bi, remaining))
 
-    return render_template('bill_detail.html', user=user, bill=bill, items_with_remaining=items_with_remaining)
+    return render_template('bill_detail.html', user=user, bill=bill, items_with_remaining=items_with_remaining,
+                           archived=isinstance(bill, ArchivedBill))
+
+
+# ---------- Exports ----------
+# Bills and bill lines for any period, streamed as CSV or NDJSON. Rows are read
+# with yield_per (a server-side cursor on Postgres) and written out in chunks, so
+# memory stays flat no matter how many years are exported.
+
+EXPORT_YIELD_PER = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def _export_stmt(build_stmt, args):
+    """
+    build_stmt(bills, lines) for the requested period (archive included when the period
+    reaches into it), with optional start/end (YYYY-MM-DD, inclusive), store and status filters.
+    """
+    start = _parse_arg(args, 'start', lambda v: datetime.strptime(v, '%Y-%m-%d'))
+    end = _parse_arg(args, 'end', lambda v: datetime.strptime(v, '%Y-%m-%d'))
+    store = _parse_arg(args, 'store', int)
+    bills, lines = bill_entities(start)
+    stmt = build_stmt(bills, lines)
+    if store is not None:
+        stmt = stmt.where(bills.store_id == store)
+    if start:
+        stmt = stmt.where(bills.created_at >= start)
+    if end:
+        stmt = stmt.where(bills.created_at < end + timedelta(days=1))
+    status = (args.get('status') or '').strip().upper()
+    if status:
+        stmt = stmt.where(bills.status == status)
+    return stmt.order_by(bills.created_at, bills.id)
+
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _export_chunks(columns, stmt, fmt):
+    rows = db.session.execute(stmt.execution_options(yield_per=EXPORT_YIELD_PER))
+    buf = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buf)
+        writer.writerow(columns)
+        write = lambda row: writer.writerow([_export_value(v) for v in row])
+    else:
+        write = lambda row: buf.write(json.dumps({c: _export_value(v) for c, v in zip(columns, row)}) + '\n')
+
+    for row in rows:
+        write(row)
+        if buf.tell() >= EXPORT_CHUNK_BYTES:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode('utf-8')
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(name, columns, build_stmt):
+    """
+    Streaming download of the rows of build_stmt(bills, lines).
+    query params: format=csv|ndjson, gzip=1, plus start/end/store/status (see _export_stmt)
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    try:
+        stmt = _export_stmt(build_stmt, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    chunks = _export_chunks(columns, stmt, fmt)
+    filename = f"{name}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    if request.args.get('gzip') == '1':
+        chunks = _gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+
+    return app.response_class(stream_with_context(chunks), mimetype=mimetype,
+                              headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+@app.route('/api/export/bills')
+@admin_required
+@reads_from_reporting
+def api_export_bills():
+    columns = ['bill_id', 'seq_code', 'created_at', 'customer_name', 'total_amount', 'status', 'note', 'staff',
+               'store', 'terminal']
+    return export_response('bills', columns, lambda bills, lines: select(
+        bills.id, bills.seq_code, bills.created_at, bills.customer_name,
+        bills.total_amount, bills.status, bills.note, User.username, Store.code, Terminal.name
+    ).outerjoin(User, User.id == bills.user_id).outerjoin(Store, Store.id == bills.store_id)
+        .outerjoin(Terminal, Terminal.id == bills.terminal_id))
+
+
+@app.route('/api/export/bill_items')
+@admin_required
+@reads_from_reporting
+def api_export_bill_items():
+    columns = ['bill_item_id', 'bill_id', 'seq_code', 'created_at', 'status', 'code', 'name', 'category',
+               'qty', 'refunded_qty', 'line_total']
+    return export_response('bill_items', columns, lambda bills, lines: select(
+        lines.id, bills.id, bills.seq_code, bills.created_at, bills.status,
+        Item.product_code, Item.name, Item.category,
+        lines.quantity, lines.refunded_qty, lines.line_total
+    ).join(bills, bills.id == lines.bill_id).outerjoin(Item, Item.id == lines.item_id))
 
 
 @app.route('/admin')
@@ -500,6 +2771,7 @@ def admin_items():
                 return render_template('admin_items.html', user=user, items=Item.query.order_by(Item.category, Item.name).all(), error='Invalid price.'), 400
 
             db.session.add(Item(product_code=code, category=category, name=name, price=price))
+            bump_cache_version('catalog')
             db.session.commit()
             
         # --- DELETE ITEM ---
@@ -517,6 +2789,7 @@ def admin_items():
                      return render_template('admin_items.html', user=user, items=Item.query.order_by(Item.category, Item.name).all(), error='Cannot delete item used in past bills. (Database safety)'), 400
                 
                 db.session.delete(item)
+                bump_cache_version('catalog')
                 db.session.commit()
 
         # --- UPDATE PRICE ---
@@ -534,8 +2807,10 @@ def admin_items():
                 return render_template('admin_items.html', user=user, items=Item.query.order_by(Item.category, Item.name).all(), error='Price must be 0 or greater.'), 400
 
             item.price = new_price
+            bump_cache_version('catalog')
             db.session.commit()
 
+        catalog.invalidate()
         return redirect(url_for('admin_items'))
 
     items = Item.query.order_by(Item.category, Item.name).all()
@@ -549,19 +2824,13 @@ def admin_items():
 
 @app.route('/api/items')
 @login_required
+@query_budget(2)
 def api_items():
-    items = Item.query.order_by(Item.category, Item.name).all()
-    data = [
-        {
-            'id': i.id,
-            'code': i.product_code,
-            'name': i.name,
-            'price': i.price,
-            'category': i.category
-        }
-        for i in items
-    ]
-    return jsonify(data)
+    snapshot = catalog.get()
+    response = app.response_class(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 
 @app.route('/api/bills', methods=['POST'])
@@ -574,52 +2843,221 @@ def api_create_bill():
     if not items_data:
         return jsonify({'error': 'No items in bill'}), 400
 
-    # Compute total from DB prices
-    total = 0.0
-    bill_items = []
-
-    for entry in items_data:
-        item_id = entry.get('item_id')
-        qty = int(entry.get('qty', 0))
-        if qty <= 0:
-            continue
-        item = Item.query.get(item_id)
-        if not item:
-            continue
-        line_total = item.price * qty
-        total += line_total
-        bill_items.append((item, qty, line_total))
+    try:
+        lines = parse_cart_lines(items_data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    bill_items, total = price_cart(lines, load_cart_items({item_id for item_id, _ in lines}))
 
     if not bill_items:
         return jsonify({'error': 'No valid items'}), 400
 
     user = get_current_user()
+    store_id, store_code, terminal_id = current_till()
+    seq_code, = bill_codes(store_code).allocate()
     bill = Bill(
+        seq_code=seq_code,
+        store_id=store_id,
+        terminal_id=terminal_id,
+        created_at=datetime.utcnow(),
         customer_name=customer_name or None,
         total_amount=total,
         status='ACTIVE',
-        user=user
+        user=db.session.merge(user, load=False) if user else None,
+        # Built on the new bill so bill.items / bi.item are already loaded for serialize_bill
+        items=[BillItem(item=item, quantity=qty, line_total=line_total, refunded_qty=0)
+               for item, qty, line_total in bill_items]
     )
-    db.session.add(bill)
-    db.session.flush()  # get bill.id
+    if app.config['BILL_GROUP_COMMIT']:
+        return jsonify(commit_bill_grouped(bill, serialize_bill(bill)))
 
-    # Assign sequential code based on ID: IL00001, IL00002, ...
-    if not bill.seq_code:
-        bill.seq_code = f"IL{bill.id:05d}"
+    begin_write()
+    db.session.add(bill)
 
-    for item, qty, line_total in bill_items:
-        db.session.add(BillItem(bill_id=bill.id, item_id=item.id, quantity=qty, line_total=line_total))
+    apply_bill_to_rollups(bill, [(item.id, item.category, qty, line_total) for item, qty, line_total in bill_items])
 
+    # Serialize from the in-memory objects before commit expires them (avoids reloading).
+    db.session.flush()  # get bill.id / bill item ids
+    data = serialize_bill(bill)
     db.session.commit()
 
-    return jsonify(serialize_bill(bill))
+    return jsonify(data)
+
+
+BATCH_MAX_BILLS = 500
+BATCH_CLOCK_SKEW = timedelta(minutes=5)  # a till's clock may run this far ahead of ours
+app.config.setdefault('BATCH_MAX_AGE_DAYS', int(os.getenv('BATCH_MAX_AGE_DAYS', '7')))
+
+
+@app.route('/api/bills/batch', methods=['POST'])
+@login_required
+def api_create_bills_batch():
+    """
+    Ingest many queued carts in one transaction.
+    body: {"bills": [{"key": "<client idempotency key>", "customer_name": "...",
+                      "created_at": "<ISO 8601, when the sale was made>", "items": [{item_id, qty}]}]}
+    created_at (optional, default now) dates the bill and its report day. Naive times are
+    UTC; times in the future or older than BATCH_MAX_AGE_DAYS are rejected.
+    Returns one result per cart, in order: created / duplicate (key already ingested) / error.
+    Replaying a batch is safe: known keys return the original bill and create nothing.
+    """
+    payload = request.get_json(force=True)
+    carts = payload.get('bills') if isinstance(payload, dict) else None
+
+    if not carts or not isinstance(carts, list):
+        return jsonify({'error': 'No bills in batch'}), 400
+    if len(carts) > BATCH_MAX_BILLS:
+        return jsonify({'error': f'At most {BATCH_MAX_BILLS} bills per batch'}), 400
+
+    try:
+        results = _ingest_bills_batch(carts)
+    except IntegrityError:
+        # A concurrent replay committed some of the same keys first; retry sees them as duplicates.
+        db.session.rollback()
+        try:
+            results = _ingest_bills_batch(carts)
+        except IntegrityError as e:
+            # Lost a second race, or a conflict no replay explains. Nothing was saved: the
+            # till keeps the batch and sends it again.
+            db.session.rollback()
+            app.logger.warning('Bill batch of %d carts conflicted twice: %s', len(carts), e.orig)
+            return jsonify({'error': 'Conflicting batch, please try again'}), 409, {'Retry-After': '1'}
+
+    return jsonify({'results': results})
+
+
+def parse_sale_time(value, now):
+    """UTC datetime of a queued cart's created_at; raises ValueError when it can't be right."""
+    try:
+        created_at = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid created_at')
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    if created_at > now + BATCH_CLOCK_SKEW:
+        raise ValueError('created_at is in the future')
+    if created_at < now - timedelta(days=app.config['BATCH_MAX_AGE_DAYS']):
+        raise ValueError('created_at is too old')
+    return min(created_at, now)
+
+
+def _parse_batch_cart(cart, now):
+    """(lines, created_at, error) of one queued cart."""
+    if not isinstance(cart, dict):
+        return [], None, 'Invalid bill'
+    try:
+        lines = parse_cart_lines(cart.get('items') or [])
+        created_at = now if cart.get('created_at') is None else parse_sale_time(cart['created_at'], now)
+    except ValueError as e:
+        return [], None, str(e)
+    return lines, created_at, None
+
+
+def _ingest_bills_batch(carts):
+    keys = [str(cart.get('key') or '').strip() if isinstance(cart, dict) else '' for cart in carts]
+    existing = {
+        r.client_key: r
+        for r in db.session.query(Bill.client_key, Bill.id, Bill.seq_code, Bill.total_amount)
+        .filter(Bill.client_key.in_({k for k in keys if k}))
+    }
+
+    now = datetime.utcnow()
+    parsed = [_parse_batch_cart(cart, now) for cart in carts]
+    items = load_cart_items({item_id for lines, _, _ in parsed for item_id, _ in lines})
+
+    results = [None] * len(carts)
+    new_bills = []  # (index, bill row, bill_items)
+    user = get_current_user()
+    store_id, store_code, terminal_id = current_till()
+
+    for i, (cart, key, (lines, created_at, error)) in enumerate(zip(carts, keys, parsed)):
+        if not isinstance(cart, dict):
+            results[i] = {'key': None, 'status': 'error', 'error': error}
+            continue
+        if not key or len(key) > 64:
+            results[i] = {'key': key, 'status': 'error', 'error': 'Missing or invalid key'}
+            continue
+        if key in existing:
+            r = existing[key]
+            if r is not None:
+                results[i] = {'key': key, 'status': 'duplicate', 'bill_id': r.id,
+                              'seq_code': r.seq_code, 'total_amount': r.total_amount}
+            continue
+        if error:
+            results[i] = {'key': key, 'status': 'error', 'error': error}
+            continue
+
+        bill_items, total = price_cart(lines, items)
+        if not bill_items:
+            results[i] = {'key': key, 'status': 'error', 'error': 'No valid items'}
+            continue
+
+        customer_name = (cart.get('customer_name') or '').strip()
+        existing[key] = None  # same key twice in one batch: later copies are duplicates
+        new_bills.append((i, {
+            'client_key': key,
+            'customer_name': customer_name or None,
+            'total_amount': total,
+            'status': 'ACTIVE',
+            'created_at': created_at,
+            'user_id': user.id if user else None,
+            'store_id': store_id,
+            'terminal_id': terminal_id,
+        }, bill_items))
+
+    if new_bills:
+        for (_, row, _), seq_code in zip(new_bills, bill_codes(store_code).allocate(len(new_bills))):
+            row['seq_code'] = seq_code
+
+        begin_write()
+        # Bulk INSERT ... RETURNING for the bills, one executemany for the lines
+        ids = db.session.scalars(
+            insert(Bill).returning(Bill.id, sort_by_parameter_order=True),
+            [row for _, row, _ in new_bills],
+        ).all()
+        db.session.execute(insert(BillItem), [
+            {'bill_id': bill_id, 'item_id': item.id, 'quantity': qty, 'refunded_qty': 0, 'line_total': line_total}
+            for bill_id, (_, _, bill_items) in zip(ids, new_bills)
+            for item, qty, line_total in bill_items
+        ])
+        add_bills_to_rollups(
+            (store_id, row['created_at'].date(), row['total_amount'],
+             [(item.id, item.category, qty, line_total) for item, qty, line_total in bill_items])
+            for _, row, bill_items in new_bills
+        )
+        db.session.commit()
+
+        for bill_id, (i, row, _) in zip(ids, new_bills):
+            results[i] = {'key': row['client_key'], 'status': 'created', 'bill_id': bill_id,
+                          'seq_code': row['seq_code'], 'total_amount': row['total_amount']}
+
+    # Keys repeated inside this batch point at the bill created for their first copy
+    created = {r['key']: r for r in results if r and r['status'] == 'created'}
+    for i, key in enumerate(keys):
+        if results[i] is None:
+            results[i] = dict(created[key], status='duplicate')
+
+    return results
+
+
+def store_bills(model=Bill):
+    """Bill (or ArchivedBill) query for the POS: staff only see their store's bills, admins every store's."""
+    query = model.query
+    if get_current_user().role != 'admin':
+        query = query.filter(model.store_id == current_till()[0])
+    return query
 
 
 @app.route('/api/bills/last')
 @login_required
+@query_budget(2)
 def api_last_bill():
-    """Return the most recent bill (any user)."""
-    bill = Bill.query.order_by(Bill.created_at.desc()).first()
+    """Return the most recent bill of this till (of this store if no till was picked)."""
+    store_id, _, terminal_id = current_till()
+    query = Bill.query.options(*BILL_LOAD_OPTIONS).filter(Bill.store_id == store_id)
+    if terminal_id is not None:
+        query = query.filter(Bill.terminal_id == terminal_id)
+    bill = query.order_by(Bill.created_at.desc(), Bill.id.desc()).first()
     if not bill:
         return jsonify({'error': 'No bills yet'}), 404
     return jsonify(serialize_bill(bill))
@@ -627,16 +3065,20 @@ def api_last_bill():
 
 @app.route('/api/bills/<int:bill_id>')
 @login_required
+@query_budget(4)  # bill, lines; archived: live miss, archive horizon poll, bill, lines
 def api_get_bill(bill_id):
-    bill = Bill.query.get_or_404(bill_id)
+    bill = find_bill(store_bills(), store_bills(ArchivedBill), id=bill_id)
+    if bill is None:
+        abort(404)
     return jsonify(serialize_bill(bill))
 
 
 @app.route('/api/bills/by_seq/<string:seq_code>')
 @login_required
+@query_budget(4)  # bill, lines; archived: live miss, archive horizon poll, bill, lines
 def api_get_bill_by_seq(seq_code):
     code = seq_code.strip().upper()
-    bill = Bill.query.filter_by(seq_code=code).first()
+    bill = find_bill(store_bills(), store_bills(ArchivedBill), seq_code=code)
     if not bill:
         return jsonify({'error': 'Bill not found'}), 404
     return jsonify(serialize_bill(bill))
@@ -650,8 +3092,6 @@ def admin_update_bill_status(bill_id):
     - status: ACTIVE / REFUNDED / CANCELLED
     - note: optional reason
     """
-    bill = Bill.query.get_or_404(bill_id)
-
     # Accept both form and JSON input
     if request.is_json:
         data = request.get_json(force=True)
@@ -664,6 +3104,11 @@ def admin_update_bill_status(bill_id):
     if new_status not in ('ACTIVE', 'REFUNDED', 'CANCELLED'):
         return jsonify({'error': 'Invalid status'}), 400
 
+    bill = lock_bill(bill_id, selectinload(Bill.items).joinedload(BillItem.item))
+    if bill.status != new_status and 'ACTIVE' in (bill.status, new_status):
+        # Bill enters or leaves the ACTIVE set: move its numbers in/out of the rollups.
+        apply_bill_to_rollups(bill, bill_rollup_lines(bill), 1 if new_status == 'ACTIVE' else -1)
+
     bill.status = new_status
     if note:
         bill.note = note
@@ -691,12 +3136,6 @@ def admin_refund_bill_item(bill_id, bill_item_id):
       - BillItem.refunded_qty
       - Bill.total_amount (subtract refund value)
     """
-    bill = Bill.query.get_or_404(bill_id)
-    bi = BillItem.query.get_or_404(bill_item_id)
-
-    if bi.bill_id != bill.id:
-        return "BillItem does not belong to this bill", 400
-
     if request.is_json:
         data = request.get_json(force=True)
         qty = int(data.get('qty', 0))
@@ -708,19 +3147,33 @@ def admin_refund_bill_item(bill_id, bill_item_id):
     if qty <= 0:
         return "Quantity must be > 0", 400
 
-    already_refunded = bi.refunded_qty or 0
-    available = bi.quantity - already_refunded
+    bill = lock_bill(bill_id)  # concurrent refunds of this bill wait here
+    bi = BillItem.query.get_or_404(bill_item_id)
 
-    if qty > available:
-        return f"Cannot refund {qty}. Only {available} left.", 400
+    if bi.bill_id != bill.id:
+        db.session.rollback()
+        return "BillItem does not belong to this bill", 400
 
     # Calculate refund amount
     unit_price = bi.item.price
     refund_amount = unit_price * qty
 
-    # Update refunded_qty and bill total
-    bi.refunded_qty = already_refunded + qty
-    bill.total_amount -= refund_amount
+    # Update refunded_qty and bill total in SQL (x = x + :v), guarded so a line can
+    # never be refunded past its quantity even by a writer that skipped lock_bill.
+    refunded = db.session.execute(
+        update(BillItem)
+        .where(BillItem.id == bi.id, BillItem.quantity - func.coalesce(BillItem.refunded_qty, 0) >= qty)
+        .values(refunded_qty=func.coalesce(BillItem.refunded_qty, 0) + qty)
+    ).rowcount
+    if not refunded:
+        available = bi.quantity - (bi.refunded_qty or 0)
+        db.session.rollback()
+        return f"Cannot refund {qty}. Only {available} left.", 400
+
+    db.session.execute(update(Bill).where(Bill.id == bill.id)
+                       .values(total_amount=Bill.total_amount - refund_amount))
+    if bill.status == 'ACTIVE':
+        bump_daily_sales(bill.store_id, bill.created_at.date(), -refund_amount)
 
     # Append note
     if note:
@@ -0,0 +1,104 @@
+"""
+Static asset build: content-hashed copies of static/ plus precompressed variants.
+
+    python assets.py        # writes static/dist/ and static/dist/manifest.json
+
+Every file becomes dist/<name>.<hash><ext> (12 hex digits of its sha256), so its URL
+changes whenever its content does and browsers may keep it for a year. Text assets also
+get a .gz sibling and, with the brotli package installed, a .br one; they are compressed
+once here instead of on every request.
+
+app.py reads the manifest: url_for('static', filename='style.css') points at the hashed
+copy and the static view picks the variant the browser accepts. Without a build the
+plain files are served as before.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg', '.html', '.txt', '.map')  # images are compressed already
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}  # preferred encoding first
+
+
+def _compress(data):
+    """{encoding: bytes} for the encodings that actually make data smaller."""
+    variants = {'gzip': gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {enc: body for enc, body in variants.items() if len(body) < len(data)}
+
+
+def _write(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build(static_dir=STATIC_DIR):
+    """Fingerprint and precompress static_dir into static_dir/dist; returns the manifest."""
+    dist = os.path.join(static_dir, DIST)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {'assets': {}, 'encodings': {}}
+    written = {MANIFEST}
+
+    for root, dirs, files in os.walk(static_dir):
+        if root == static_dir:
+            dirs[:] = [d for d in dirs if d != DIST]
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            rel = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            stem, ext = os.path.splitext(rel.replace('/', '.'))
+            hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            variants = _compress(data) if ext.lower() in COMPRESSIBLE else {}
+
+            # Content-addressed: a file that exists already has these bytes
+            target = os.path.join(dist, hashed)
+            if not os.path.exists(target):
+                _write(target, data)
+            for enc, body in variants.items():
+                if not os.path.exists(target + SUFFIXES[enc]):
+                    _write(target + SUFFIXES[enc], body)
+
+            manifest['assets'][rel] = f"{DIST}/{hashed}"
+            manifest['encodings'][f"{DIST}/{hashed}"] = [enc for enc in SUFFIXES if enc in variants]
+            written.add(hashed)
+            written.update(hashed + SUFFIXES[enc] for enc in variants)
+
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    for name in os.listdir(dist):  # builds of files that have since changed
+        if name not in written:
+            os.remove(os.path.join(dist, name))
+    return manifest
+
+
+def load_manifest(static_dir=STATIC_DIR):
+    """The last build's manifest, or an empty one if assets were never built."""
+    try:
+        with open(os.path.join(static_dir, DIST, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'assets': {}, 'encodings': {}}
+
+
+if __name__ == "__main__":
+    manifest = build()
+    for name, hashed in sorted(manifest['assets'].items()):
+        size = os.path.getsize(os.path.join(STATIC_DIR, hashed))
+        variants = ', '.join(f"{enc} {os.path.getsize(os.path.join(STATIC_DIR, hashed + SUFFIXES[enc])):,}"
+                             for enc in manifest['encodings'][hashed])
+        print(f"✅ {name} -> {hashed}  ({size:,} bytes{'; ' + variants if variants else ''})")
+    if brotli is None:
+        print("⚠️  brotli not installed: gzip variants only")
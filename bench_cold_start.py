@@ -0,0 +1,68 @@
+"""
+Measure worker cold start: `import app` plus the first request, in a fresh interpreter.
+
+    python bench_cold_start.py [--runs 5]
+
+Uses a temporary SQLite database, in two modes:
+  fresh        empty database: the first request creates, migrates and seeds it
+  initialized  after `flask db-init`: the first request only checks the schema version
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = r'''
+import json, time
+t0 = time.perf_counter()
+import app as pos
+t1 = time.perf_counter()
+pos.app.test_client().get('/login')
+t2 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'first_request_ms': (t2 - t1) * 1000}))
+'''
+
+
+def run_child(db_path):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}')
+    out = subprocess.run([sys.executable, '-c', CHILD], cwd=HERE, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def db_init(db_path):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}')
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db-init'], cwd=HERE, env=env,
+                   capture_output=True, check=True)
+
+
+def summarize(name, samples):
+    imp = statistics.median(s['import_ms'] for s in samples)
+    first = statistics.median(s['first_request_ms'] for s in samples)
+    print(f"{name:<12} import {imp:8.1f} ms   first request {first:8.1f} ms   total {imp + first:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fresh = [run_child(os.path.join(tmp, f'fresh{i}.db')) for i in range(args.runs)]
+
+        ready_db = os.path.join(tmp, 'ready.db')
+        db_init(ready_db)
+        initialized = [run_child(ready_db) for _ in range(args.runs)]
+
+    print(f"Cold start, median of {args.runs} runs")
+    summarize('fresh', fresh)
+    summarize('initialized', initialized)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Checkout throughput per deployment profile (config.py).
+
+    python bench_db_profiles.py [--seconds 5] [--threads N]
+        [--postgres-url postgresql://...] [--pgbouncer-url postgresql://...]
+
+For each profile, in a fresh interpreter with DB_PROFILE set, N threads (default: the
+profile's gunicorn threads per worker) run for --seconds:
+  pool      check out a connection, SELECT 1, return it
+  checkout  POST /api/bills with a 3-line cart, as a logged-in cashier
+
+sqlite-single-node uses a temporary SQLite file. The Postgres profiles run only when a
+URL is given (or DATABASE_URL / PGBOUNCER_URL is set); postgres-pooled falls back to
+the PgBouncer URL and vice versa. The checkout phase creates real bills: use a scratch
+database and `python flush_bills.py` afterwards.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = r'''
+import json, os, threading, time
+import app as pos
+
+threads = int(os.environ['BENCH_THREADS'])
+seconds = float(os.environ['BENCH_SECONDS'])
+
+with pos.app.app_context():
+    pos.init_db()
+    engine = pos.db.engine
+    item_ids = [i.id for i in pos.Item.query.limit(3)]
+cart = {'customer_name': 'bench', 'items': [{'item_id': i, 'qty': 1} for i in item_ids]}
+
+
+def pool_op(_):
+    with engine.connect() as conn:
+        conn.exec_driver_sql('SELECT 1').scalar()
+
+
+def make_client():
+    client = pos.app.test_client()
+    client.post('/login', data={'username': 'amar', 'password': 'amar123'})
+    return client
+
+
+def checkout_op(client):
+    resp = client.post('/api/bills', json=cart)
+    if resp.status_code != 200:
+        raise RuntimeError(f'checkout failed: {resp.status_code} {resp.get_data(as_text=True)[:200]}')
+
+
+def run(op, make_state=lambda: None):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        state = make_state()
+        mine = []
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                op(state)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            mine.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(mine)
+
+    ts = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in ts: t.start()
+    for t in ts: t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0
+    return {'ops_per_s': len(latencies) / elapsed, 'p50_ms': pct(0.50), 'p99_ms': pct(0.99),
+            'errors': len(errors), 'first_error': errors[0] if errors else None}
+
+
+print(json.dumps({'pool': run(pool_op), 'checkout': run(checkout_op, make_client)}))
+'''
+
+
+def run_profile(profile, url, threads, seconds):
+    env = dict(os.environ, DATABASE_URL=url, DB_PROFILE=profile, BENCH_SECONDS=str(seconds))
+    if threads:
+        env['GUNICORN_THREADS'] = str(threads)
+    # Threads per worker as the profile would run them under gunicorn
+    env['BENCH_THREADS'] = subprocess.run(
+        [sys.executable, '-c', f'import config; print(config.worker_threads({profile!r}))'],
+        cwd=HERE, env=env, capture_output=True, text=True, check=True).stdout.strip()
+
+    proc = subprocess.run([sys.executable, '-c', CHILD], cwd=HERE, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(f"❌ {profile}: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed'}")
+        return
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"{profile}  ({env['BENCH_THREADS']} threads)")
+    for phase in ('pool', 'checkout'):
+        r = result[phase]
+        print(f"  {phase:<9} {r['ops_per_s']:9.1f} ops/s   p50 {r['p50_ms']:7.2f} ms   p99 {r['p99_ms']:7.2f} ms"
+              + (f"   ⚠️ {r['errors']} errors ({r['first_error']})" if r['errors'] else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--threads', type=int, help="default: the profile's threads per worker")
+    parser.add_argument('--postgres-url', default=os.getenv('DATABASE_URL', ''))
+    parser.add_argument('--pgbouncer-url', default=os.getenv('PGBOUNCER_URL', ''))
+    args = parser.parse_args()
+
+    postgres_url = args.postgres_url if not args.postgres_url.startswith('sqlite') else ''
+    pgbouncer_url = args.pgbouncer_url or postgres_url
+    postgres_url = postgres_url or pgbouncer_url
+
+    print(f"Checkout throughput, {args.seconds:g}s per phase")
+    with tempfile.TemporaryDirectory() as tmp:
+        run_profile('sqlite-single-node', f"sqlite:///{os.path.join(tmp, 'bench.db')}", args.threads, args.seconds)
+
+    for profile, url in (('postgres-pooled', postgres_url), ('pgbouncer-transaction-mode', pgbouncer_url)):
+        if url:
+            run_profile(profile, url, args.threads, args.seconds)
+        else:
+            print(f"⚠️  {profile}: skipped (pass --postgres-url / --pgbouncer-url)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Checkout throughput and tail latency with and without group commit (BILL_GROUP_COMMIT).
+
+    python bench_group_commit.py [--seconds 5] [--threads 16] [--window-ms 5]
+
+Each mode runs in a fresh interpreter: --threads logged-in cashiers POST /api/bills with
+a 3-line cart for --seconds. With grouping on, the report also shows how many bills each
+commit carried on average (from the pos_bill_group_commit_size histogram).
+
+Uses a temporary SQLite file per mode, or DATABASE_URL if set; that database gets the
+bills, so use a scratch one and `python flush_bills.py` afterwards.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = r'''
+import json, os, threading, time
+import app as pos
+
+threads = int(os.environ['BENCH_THREADS'])
+seconds = float(os.environ['BENCH_SECONDS'])
+
+with pos.app.app_context():
+    pos.init_db()
+    item_ids = [i.id for i in pos.Item.query.limit(3)]
+cart = {'customer_name': 'bench', 'items': [{'item_id': i, 'qty': 1} for i in item_ids]}
+
+login = pos.app.test_client()
+login.post('/login', data={'username': 'amar', 'password': 'amar123'})
+cookie = login.get_cookie('session').value  # logging in is slow and not what is measured
+
+latencies, errors = [], []
+lock = threading.Lock()
+deadline = time.perf_counter() + seconds
+
+
+def worker():
+    client = pos.app.test_client()
+    client.set_cookie('session', cookie)
+    mine = []
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        resp = client.post('/api/bills', json=cart)
+        if resp.status_code != 200 or not resp.get_json()['bill_id']:
+            with lock:
+                errors.append(f'{resp.status_code} {resp.get_data(as_text=True)[:200]}')
+            continue
+        mine.append(time.perf_counter() - t0)
+    with lock:
+        latencies.extend(mine)
+
+
+ts = [threading.Thread(target=worker) for _ in range(threads)]
+start = time.perf_counter()
+for t in ts: t.start()
+for t in ts: t.join()
+elapsed = time.perf_counter() - start
+
+latencies.sort()
+pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0
+groups = pos.metrics.group_size
+print(json.dumps({'ops_per_s': len(latencies) / elapsed, 'p50_ms': pct(0.50), 'p99_ms': pct(0.99),
+                  'p999_ms': pct(0.999), 'errors': len(errors), 'first_error': errors[0] if errors else None,
+                  'groups': sum(s[-1] for s in groups.series.values()),
+                  'grouped_bills': sum(s[-2] for s in groups.series.values())}))
+'''
+
+
+def run_mode(grouped, url, args):
+    env = dict(os.environ, DATABASE_URL=url, BENCH_THREADS=str(args.threads), BENCH_SECONDS=str(args.seconds),
+               BILL_GROUP_COMMIT='1' if grouped else '0', BILL_GROUP_COMMIT_MS=str(args.window_ms))
+    proc = subprocess.run([sys.executable, '-c', CHILD], cwd=HERE, env=env, capture_output=True, text=True)
+    name = f"grouped ({args.window_ms:g} ms)" if grouped else 'per request'
+    if proc.returncode != 0:
+        print(f"❌ {name}: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed'}")
+        return
+    r = json.loads(proc.stdout.strip().splitlines()[-1])
+    per_commit = f"   {r['grouped_bills'] / r['groups']:.1f} bills/commit" if r['groups'] else ''
+    print(f"  {name:<18} {r['ops_per_s']:8.1f} bills/s   p50 {r['p50_ms']:7.2f} ms   p99 {r['p99_ms']:7.2f} ms"
+          f"   p99.9 {r['p999_ms']:7.2f} ms{per_commit}"
+          + (f"   ⚠️ {r['errors']} errors ({r['first_error']})" if r['errors'] else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--window-ms', type=float, default=5, help='BILL_GROUP_COMMIT_MS for the grouped run')
+    args = parser.parse_args()
+
+    url = os.getenv('DATABASE_URL', '')
+    print(f"Checkout, {args.threads} threads, {args.seconds:g}s per mode on {url or 'a temporary SQLite file'}")
+    for grouped in (False, True):
+        if url:
+            run_mode(grouped, url, args)
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                run_mode(grouped, f"sqlite:///{os.path.join(tmp, 'bench.db')}", args)
+
+
+if __name__ == "__main__":
+    main()
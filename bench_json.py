@@ -0,0 +1,113 @@
+"""
+JSON encoding time and bytes on the wire for the report endpoints.
+
+    python bench_json.py [--bills 20000] [--repeat 5]
+
+Fills a temporary SQLite database with --bills bills (3 lines each) spread over this
+year, then fetches each report for the whole year once. For each body it prints:
+  encode     time to build the response from the payload, per JSON provider
+             (stdlib = Flask's default; orjson only if installed)
+  bytes      identity / gzip / br (br only with the brotli package), with the time the
+             after_request compression takes at the app's levels
+Times are the best of --repeat runs.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--bills', type=int, default=20000)
+parser.add_argument('--repeat', type=int, default=5)
+args = parser.parse_args()
+
+tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+
+from sqlalchemy import insert  # noqa: E402
+import fastjson  # noqa: E402
+from app import app, db, init_db, rebuild_rollups, compress_body, brotli, Bill, BillItem, Item, User  # noqa: E402
+
+
+def seed(n):
+    """n bills with 3 random lines each, between Jan 1st and now."""
+    rng = random.Random(1)
+    now = datetime.utcnow()
+    start = datetime(now.year, 1, 1)
+    span = (now - start).total_seconds()
+    items = [(i.id, i.price) for i in Item.query.all()]
+    users = [u.id for u in User.query.all()]
+    for offset in range(0, n, 5000):
+        rows, lines = [], []
+        for k in range(offset, min(offset + 5000, n)):
+            picked = rng.sample(items, 3)
+            qtys = [rng.randint(1, 3) for _ in picked]
+            rows.append({'seq_code': f'BJ{k:07d}', 'created_at': start + timedelta(seconds=rng.random() * span),
+                         'total_amount': sum(p * q for (_, p), q in zip(picked, qtys)), 'status': 'ACTIVE',
+                         'user_id': rng.choice(users), 'store_id': 1})
+            lines.append([(item_id, q, p * q) for (item_id, p), q in zip(picked, qtys)])
+        ids = db.session.scalars(insert(Bill).returning(Bill.id, sort_by_parameter_order=True), rows).all()
+        db.session.execute(insert(BillItem), [
+            {'bill_id': bill_id, 'item_id': item_id, 'quantity': q, 'refunded_qty': 0, 'line_total': total}
+            for bill_id, bill_lines in zip(ids, lines) for item_id, q, total in bill_lines])
+    rebuild_rollups()
+    db.session.commit()
+
+
+def best_ms(fn):
+    best = float('inf')
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    with app.app_context():
+        init_db()
+        seed(args.bills)
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'Iceland@2025'})
+    year, today = datetime.utcnow().year, datetime.utcnow().date()
+    endpoints = [
+        f'/api/reports/sales?type=yearly&date={year}&limit=500',
+        f'/api/reports/items?start={year}-01-01&end={today}',
+        '/api/reports/analysis',
+        f'/api/reports/heatmap?type=yearly&date={year}',
+        f'/api/reports/staff?type=yearly&date={year}',
+        f'/api/reports/basket?type=yearly&date={year}',
+        '/api/bills/search?limit=100',
+    ]
+    providers = {name: cls(app) for name, cls in fastjson.PROVIDERS.items()
+                 if name != 'orjson' or fastjson.orjson is not None}
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+
+    print(f"{args.bills:,} bills this year; JSON provider in use: {type(app.json).__name__}")
+    if fastjson.orjson is None:
+        print("⚠️  orjson not installed: stdlib only")
+    if brotli is None:
+        print("⚠️  brotli not installed: gzip only")
+
+    for url in endpoints:
+        resp = client.get(url, headers={'Accept-Encoding': 'identity'})
+        if resp.status_code != 200:
+            print(f"❌ {url}: HTTP {resp.status_code}")
+            continue
+        body = resp.get_data()
+        payload = app.json.loads(body)
+
+        with app.app_context():
+            encode = '   '.join(f"{name} {best_ms(lambda: p.response(payload).get_data()):6.2f} ms"
+                               for name, p in providers.items())
+        wire = '   '.join(f"{enc} {len(compress_body(body, enc)):>8,} B ({best_ms(lambda: compress_body(body, enc)):5.2f} ms)"
+                          for enc in encodings)
+        print(f"{url.split('?')[0]}\n  encode   {encode}\n  bytes    identity {len(body):>8,} B   {wire}")
+
+
+if __name__ == "__main__":
+    main()
+    tmp.cleanup()
@@ -0,0 +1,149 @@
+"""
+Multi-process SQLite write benchmark: rollback journal vs WAL.
+
+    python bench_sqlite_writers.py [--processes 4] [--threads 2] [--seconds 5]
+
+Like gunicorn with the sqlite-single-node profile: --processes separate interpreters,
+each with --threads cashiers posting 3-line carts to /api/bills, all on one database
+file, while one more process keeps reading (the day's bill count and revenue, as a
+report would). Runs twice on a fresh temporary file:
+  rollback journal   SQLITE_JOURNAL_MODE=DELETE, SQLITE_SYNCHRONOUS=FULL (SQLite's defaults)
+  wal                the app's defaults (WAL, synchronous=NORMAL)
+and prints bills/s, checkout and read latency and how many requests failed with
+"database is locked" (HTTP 503 / 500).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SETUP = r'''
+import app as pos
+with pos.app.app_context():
+    pos.init_db()
+'''
+
+WRITER = r'''
+import json, os, sys, threading, time
+import app as pos
+
+threads = int(os.environ['BENCH_THREADS'])
+seconds = float(os.environ['BENCH_SECONDS'])
+
+with pos.app.app_context():
+    item_ids = [i.id for i in pos.Item.query.limit(3)]
+cart = {'customer_name': 'bench', 'items': [{'item_id': i, 'qty': 1} for i in item_ids]}
+login = pos.app.test_client()
+login.post('/login', data={'username': 'amar', 'password': 'amar123'})
+cookie = login.get_cookie('session').value
+
+latencies, errors = [], []
+lock = threading.Lock()
+
+
+def worker():
+    client = pos.app.test_client()
+    client.set_cookie('session', cookie)
+    mine = []
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        try:
+            resp = client.post('/api/bills', json=cart)
+            ok = resp.status_code == 200
+        except Exception:  # "database is locked" escaping as an exception
+            ok = False
+        if not ok:
+            with lock:
+                errors.append(1)
+            continue
+        mine.append(time.perf_counter() - t0)
+    with lock:
+        latencies.extend(mine)
+
+
+print('ready', flush=True)
+sys.stdin.readline()  # every process starts together
+deadline = time.perf_counter() + seconds
+ts = [threading.Thread(target=worker) for _ in range(threads)]
+for t in ts: t.start()
+for t in ts: t.join()
+print(json.dumps({'latencies': latencies, 'errors': len(errors)}))
+'''
+
+READER = r'''
+import json, os, sys, time
+import app as pos
+
+seconds = float(os.environ['BENCH_SECONDS'])
+latencies, errors = [], 0
+with pos.app.app_context():
+    print('ready', flush=True)
+    sys.stdin.readline()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        try:
+            with pos.db.engine.connect() as conn:
+                conn.exec_driver_sql("SELECT count(*), sum(total_amount) FROM bill WHERE created_at >= date('now')").one()
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - t0)
+print(json.dumps({'latencies': latencies, 'errors': errors}))
+'''
+
+
+def pct(values, p):
+    return values[min(len(values) - 1, int(p * len(values)))] * 1000 if values else 0
+
+
+def run_mode(name, env_overrides, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                   DB_PROFILE='sqlite-single-node', BILL_GROUP_COMMIT='0',
+                   BENCH_THREADS=str(args.threads), BENCH_SECONDS=str(args.seconds), **env_overrides)
+        subprocess.run([sys.executable, '-c', SETUP], cwd=HERE, env=env, check=True, capture_output=True)
+
+        procs = [subprocess.Popen([sys.executable, '-c', script], cwd=HERE, env=env, stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                 for script in [WRITER] * args.processes + [READER]]
+        for proc in procs:  # wait until every interpreter has imported the app and logged in
+            proc.stdout.readline()
+        for proc in procs:
+            proc.stdin.write('go\n')
+            proc.stdin.flush()
+        results = []
+        for proc in procs:
+            out, err = proc.communicate()
+            if proc.returncode != 0:
+                print(f"❌ {name}: {err.strip().splitlines()[-1] if err.strip() else 'failed'}")
+                return
+            results.append(json.loads(out.strip().splitlines()[-1]))
+
+    writes = sorted(l for r in results[:-1] for l in r['latencies'])
+    reads = sorted(results[-1]['latencies'])
+    failed = sum(r['errors'] for r in results[:-1])
+    print(f"  {name:<17} {len(writes) / args.seconds:8.1f} bills/s   checkout p50 {pct(writes, 0.5):7.2f} ms"
+          f"  p99 {pct(writes, 0.99):8.2f} ms   read p99 {pct(reads, 0.99):7.2f} ms"
+          + (f"   ⚠️ {failed} failed checkouts" if failed else '')
+          + (f", {results[-1]['errors']} failed reads" if results[-1]['errors'] else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=2, help='writer threads per process')
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.processes} processes x {args.threads} writer threads + 1 reader, {args.seconds:g}s per mode")
+    run_mode('rollback journal', {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL'}, args)
+    run_mode('wal', {'SQLITE_JOURNAL_MODE': 'WAL', 'SQLITE_SYNCHRONOUS': 'NORMAL'}, args)
+
+
+if __name__ == "__main__":
+    main()
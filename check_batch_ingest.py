@@ -0,0 +1,79 @@
+"""
+Check that /api/bills/batch recovers from insert conflicts.
+
+    python check_batch_ingest.py
+
+Uses a temporary SQLite file. Each case makes the batch insert hit a real unique-key
+violation (a row with an already ingested client_key) before it runs:
+  one conflict             the retry ingests the batch (200, bill created)
+  two conflicts in a row   409 with Retry-After, nothing saved
+  the same batch again     ingested: the session was left clean
+  and once more            reported as a duplicate, no second bill
+Exits 1 on any mismatch.
+"""
+import os
+import sys
+import tempfile
+
+tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp.name, 'batch.db')}"
+
+import app as pos  # noqa: E402  (URL first)
+from app import app, db, init_db, Bill  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+CART = [{'item_id': 1, 'qty': 2}, {'item_id': 2, 'qty': 1}]
+
+
+def main():
+    with app.app_context():
+        init_db()
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'Iceland@2025'})
+    client.post('/api/bills/batch', json={'bills': [{'key': 'seed', 'items': CART}]})
+
+    ingest = pos._ingest_bills_batch
+    conflicts = {'left': 0}
+
+    def conflicting_ingest(carts):
+        if conflicts['left']:
+            conflicts['left'] -= 1
+            db.session.execute(insert(Bill), [{'client_key': 'seed', 'total_amount': 0, 'status': 'ACTIVE'}])
+        return ingest(carts)
+
+    pos._ingest_bills_batch = conflicting_ingest
+
+    failures = []
+
+    def check(name, ok):
+        print(f"{'✅' if ok else '❌'} {name}")
+        if not ok:
+            failures.append(name)
+
+    def post(key, conflict_count):
+        conflicts['left'] = conflict_count
+        return client.post('/api/bills/batch', json={'bills': [{'key': key, 'items': CART}]})
+
+    def bills(key):
+        with app.app_context():
+            return Bill.query.filter_by(client_key=key).count()
+
+    r = post('once', 1)
+    check('one conflict: the retry ingests the batch',
+          r.status_code == 200 and r.get_json()['results'][0]['status'] == 'created' and bills('once') == 1)
+    r = post('twice', 2)
+    check('two conflicts in a row: 409 with Retry-After, nothing saved',
+          r.status_code == 409 and r.headers.get('Retry-After') == '1' and 'error' in r.get_json()
+          and bills('twice') == 0)
+    r = post('twice', 0)
+    check('the same batch again is ingested',
+          r.status_code == 200 and r.get_json()['results'][0]['status'] == 'created' and bills('twice') == 1)
+    r = post('twice', 0)
+    check('and once more is a duplicate',
+          r.status_code == 200 and r.get_json()['results'][0]['status'] == 'duplicate' and bills('twice') == 1)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
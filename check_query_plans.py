@@ -0,0 +1,77 @@
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import select, or_
+from app import app, db, init_db, Bill, BillItem
+
+
+def hot_queries():
+    """The bill queries behind reports, bill lookups and the item admin page."""
+    now = datetime.utcnow()
+    return {
+        'ACTIVE bills in a period': select(Bill)
+            .where(Bill.status == 'ACTIVE', Bill.created_at >= now - timedelta(days=30), Bill.created_at < now)
+            .order_by(Bill.created_at),
+        'ACTIVE bills of a store in a period': select(Bill)
+            .where(Bill.store_id == 1, Bill.status == 'ACTIVE',
+                   Bill.created_at >= now - timedelta(days=30), Bill.created_at < now)
+            .order_by(Bill.created_at),
+        'latest bill': select(Bill).order_by(Bill.created_at.desc()).limit(1),
+        "latest bill of a store's till": select(Bill)
+            .where(Bill.store_id == 1, Bill.terminal_id == 1)
+            .order_by(Bill.created_at.desc(), Bill.id.desc()).limit(1),
+        'bill search page after a cursor': select(Bill)
+            .where(Bill.created_at <= now, or_(Bill.created_at < now, Bill.id < 1000))
+            .order_by(Bill.created_at.desc(), Bill.id.desc()).limit(51),
+        'bill search by staff': select(Bill)
+            .where(Bill.user_id == 1).order_by(Bill.created_at.desc(), Bill.id.desc()).limit(51),
+        'bill by seq_code': select(Bill).where(Bill.seq_code == 'IL00001'),
+        'lines of a bill': select(BillItem).where(BillItem.bill_id == 1),
+        'item used in a bill': select(BillItem.id).where(BillItem.item_id == 1).limit(1),
+    }
+
+
+def explain(conn, stmt):
+    """Return (plan text, True if the plan reads a whole table)."""
+    compiled = stmt.compile(dialect=conn.dialect)
+
+    if conn.dialect.name == 'postgresql':
+        rows = conn.exec_driver_sql('EXPLAIN ' + compiled.string, compiled.params).all()
+        plan = '\n'.join(r[0] for r in rows)
+        return plan, 'Seq Scan' in plan
+
+    # SQLite: "SCAN bill" is a full table scan, "SEARCH ..." / "SCAN ... USING INDEX" are not
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + compiled.string, params).all()
+    plan = '\n'.join(r[-1] for r in rows)
+    full_scan = any(line.startswith('SCAN ') and ' USING ' not in line for line in plan.splitlines())
+    return plan, full_scan
+
+
+def check_query_plans():
+    """
+    EXPLAIN every hot query against the configured database.
+    Returns the number of queries that fell back to a sequential scan.
+    """
+    failures = 0
+    with db.engine.connect() as conn:
+        if conn.dialect.name == 'postgresql':
+            # Tiny test tables make a seq scan look cheapest; only accept it if no index applies.
+            conn.exec_driver_sql('SET enable_seqscan = off')
+
+        for name, stmt in hot_queries().items():
+            plan, full_scan = explain(conn, stmt)
+            if full_scan:
+                failures += 1
+                print(f"❌ {name}: sequential scan")
+                for line in plan.splitlines():
+                    print(f"     {line}")
+            else:
+                print(f"✅ {name}")
+    return failures
+
+
+if __name__ == "__main__":
+    with app.app_context():
+        print(f"Target Database: {app.config['SQLALCHEMY_DATABASE_URI']}")
+        init_db()
+        sys.exit(1 if check_query_plans() else 0)
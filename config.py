@@ -0,0 +1,166 @@
+"""
+Deployment profiles: database engine options and the gunicorn worker model that goes with them.
+
+Pick one with DB_PROFILE, otherwise it follows DATABASE_URL (SQLite -> sqlite-single-node,
+anything else -> postgres-pooled):
+
+  sqlite-single-node          local SQLite file, a few workers on one machine
+  postgres-pooled             direct Postgres connection, each worker keeps its own pool
+  pgbouncer-transaction-mode  Postgres behind PgBouncer in transaction mode (Neon/Supabase
+                              "pooler" URLs); PgBouncer does the pooling, so the app doesn't
+
+Both app.py (engine options) and gunicorn.conf.py (workers/threads) read from here, so the
+pool is always sized for the number of threads that share it.
+"""
+import os
+
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+
+PROFILES = ('sqlite-single-node', 'postgres-pooled', 'pgbouncer-transaction-mode')
+
+# Server-side limits (milliseconds, 0 disables). A runaway query or a transaction left
+# open by a crashed request gets cancelled instead of holding locks and a connection.
+STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '15000'))
+IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.getenv('DB_IDLE_IN_TRANSACTION_TIMEOUT_MS', '30000'))
+
+# SQLite file settings, applied to every connection (see install_engine_hooks).
+# WAL lets readers and the one writer work at the same time; with synchronous=NORMAL a
+# commit doesn't wait for fsync (a power cut can lose the last few commits, never
+# corrupt the file). busy_timeout is how long a writer waits for the write lock.
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_PRAGMAS = (
+    ('journal_mode', os.getenv('SQLITE_JOURNAL_MODE', 'WAL')),
+    ('synchronous', os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')),
+    ('busy_timeout', SQLITE_BUSY_TIMEOUT_MS),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('cache_size', -64000),  # KiB, i.e. 64 MB of page cache per connection
+)
+
+
+def profile_name(database_url):
+    """The profile from DB_PROFILE, or the default for this database URL."""
+    name = os.getenv('DB_PROFILE')
+    if not name:
+        return 'sqlite-single-node' if database_url.startswith('sqlite') else 'postgres-pooled'
+    if name not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {name!r}, expected one of: {', '.join(PROFILES)}")
+    return name
+
+
+def worker_count(profile):
+    """
+    Gunicorn worker processes. WEB_CONCURRENCY (set by Render/Heroku) wins; otherwise:
+      sqlite-single-node          min(CPUs, 4): SQLite has one writer, more processes only queue on it
+      postgres-pooled             CPUs + 1: every worker holds its own pool, so stay modest
+      pgbouncer-transaction-mode  2 * CPUs + 1: client connections are cheap behind PgBouncer
+    """
+    if os.getenv('WEB_CONCURRENCY'):
+        return int(os.environ['WEB_CONCURRENCY'])
+    cpus = os.cpu_count() or 1
+    if profile == 'sqlite-single-node':
+        return min(cpus, 4)
+    if profile == 'postgres-pooled':
+        return cpus + 1
+    return 2 * cpus + 1
+
+
+def worker_threads(profile):
+    """Threads per gthread worker (GUNICORN_THREADS overrides)."""
+    if os.getenv('GUNICORN_THREADS'):
+        return int(os.environ['GUNICORN_THREADS'])
+    return 2 if profile == 'sqlite-single-node' else 4
+
+
+def engine_options(profile, database_url):
+    """SQLALCHEMY_ENGINE_OPTIONS for the profile."""
+    threads = worker_threads(profile)
+
+    if profile == 'sqlite-single-node':
+        # SQLite has no statement timeout; `timeout` is how long a writer waits for the lock.
+        if _sqlite_in_memory(database_url):
+            return {}
+        return {
+            'pool_size': threads,
+            'max_overflow': threads,
+            'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False},
+        }
+
+    if profile == 'postgres-pooled':
+        # One connection per thread, plus headroom for the short side transactions that
+        # reserve bill numbers while a request already holds its connection.
+        # Total server connections = workers * (pool_size + max_overflow); keep it under
+        # the database's max_connections.
+        return {
+            'pool_size': threads,
+            'max_overflow': 2,
+            'pool_timeout': 10,
+            'pool_recycle': 1800,  # managed Postgres drops idle connections after a while
+            'pool_pre_ping': True,
+            'pool_use_lifo': True,  # reuse warm connections, let the rest idle out
+            'connect_args': {
+                'connect_timeout': 5,
+                'options': f'-c statement_timeout={STATEMENT_TIMEOUT_MS}'
+                           f' -c idle_in_transaction_session_timeout={IDLE_IN_TRANSACTION_TIMEOUT_MS}',
+            },
+        }
+
+    # pgbouncer-transaction-mode: a server connection only belongs to us for one
+    # transaction, so no client-side pool (it would pin nothing and hide stale sockets)
+    # and no session-level settings; the timeout is set per transaction instead
+    # (see install_engine_hooks). PgBouncer rejects the `options` startup parameter.
+    return {
+        'poolclass': NullPool,
+        'connect_args': {'connect_timeout': 5},
+    }
+
+
+def _sqlite_in_memory(database_url):
+    return database_url in ('sqlite://', 'sqlite:///:memory:')
+
+
+def install_engine_hooks(engine, profile):
+    """Per-connection and per-transaction settings that can't go in the connection string."""
+    if engine.dialect.name == 'sqlite':
+        if not _sqlite_in_memory(str(engine.url)):
+            @event.listens_for(engine, 'connect')
+            def _set_sqlite_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                try:
+                    for name, value in SQLITE_PRAGMAS:
+                        cursor.execute(f'PRAGMA {name} = {value}')
+                finally:
+                    cursor.close()
+        return
+
+    if profile != 'pgbouncer-transaction-mode' or not STATEMENT_TIMEOUT_MS:
+        return
+
+    @event.listens_for(engine, 'begin')
+    def _set_statement_timeout(conn):
+        # Straight on the DBAPI cursor: it's plumbing, not one of the request's queries.
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(f'SET LOCAL statement_timeout = {STATEMENT_TIMEOUT_MS}')
+        finally:
+            cursor.close()
+
+
+def gunicorn_settings(profile):
+    """Worker model for gunicorn.conf.py."""
+    return {
+        'worker_class': 'gthread',
+        'workers': worker_count(profile),
+        'threads': worker_threads(profile),
+        # Import the app once in the master and fork it: workers start faster and share
+        # the loaded code. Database pools are reset after fork (gunicorn.conf.py).
+        'preload_app': True,
+        # Just above the statement timeout, so a slow query fails before the worker is killed.
+        'timeout': max(30, STATEMENT_TIMEOUT_MS // 1000 + 5),
+        'graceful_timeout': 30,
+        'keepalive': 5,
+        # Recycle workers now and then to cap slow memory growth.
+        'max_requests': 2000,
+        'max_requests_jitter': 200,
+    }
+
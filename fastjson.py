@@ -0,0 +1,61 @@
+"""
+JSON provider for Flask: orjson when it is installed, the standard library otherwise.
+
+    app.json = fastjson.provider_class()(app)    # JSON_PROVIDER=orjson / stdlib to choose
+
+jsonify, request.get_json and app.json.dumps then use it. orjson encodes the report
+and bill payloads (long lists of dicts with floats) several times faster. The output
+means the same as Flask's: keys sorted, compact, dates and Decimals through Flask's
+default(). It differs only in spacing, in UTF-8 instead of \\u escapes, and NaN
+becomes null. Calls with stdlib-only arguments (indent, cls, ...) and debug mode's
+pretty printing go to the standard library.
+"""
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: see requirements.txt
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson doing the encoding and decoding."""
+
+    if orjson is not None:
+        # datetime / date go through default() so they come out as Flask writes them
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps_bytes(self, obj):
+        """obj as compact UTF-8 JSON."""
+        return orjson.dumps(obj, default=self.default, option=self.option)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)  # indented
+        body = self.dumps_bytes(self._prepare_response_obj(args, kwargs))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+PROVIDERS = {'orjson': OrjsonProvider, 'stdlib': DefaultJSONProvider}
+
+
+def provider_class(name=None):
+    """The provider for name (default: JSON_PROVIDER, else orjson if installed)."""
+    name = name or os.getenv('JSON_PROVIDER') or ('orjson' if orjson is not None else 'stdlib')
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown JSON_PROVIDER {name!r}, expected one of: {', '.join(PROVIDERS)}")
+    if name == 'orjson' and orjson is None:
+        raise ValueError("JSON_PROVIDER=orjson but orjson is not installed")
+    return PROVIDERS[name]
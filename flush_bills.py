@@ -1,10 +1,13 @@
 import os
+from datetime import date
 from sqlalchemy import text
-from app import app, db, Bill, BillItem
+from app import (app, db, Bill, BillItem, SeqCounter, ArchivedBill, ArchivedBillItem, ArchiveRun,
+                 DailySales, DailyItemSales, ReportTouch)
 
 def flush_bills():
     """
-    Deletes ALL bills and bill items from the database.
+    Deletes ALL bills and bill items from the database, archived ones included.
+    Clears the daily sales rollups with them, so reports read zero.
     Does NOT delete users or menu items.
     Resets the auto-increment sequence to 1.
     """
@@ -18,26 +21,41 @@ def flush_bills():
         # 1. Delete all rows
         num_items = db.session.query(BillItem).delete()
         num_bills = db.session.query(Bill).delete()
+        num_items += db.session.query(ArchivedBillItem).delete()
+        num_bills += db.session.query(ArchivedBill).delete()
+        db.session.query(ArchiveRun).delete()
+        # Rollups go in the same transaction: reports must never count deleted bills
+        db.session.query(DailyItemSales).delete()
+        db.session.query(DailySales).delete()
+        db.session.add(ReportTouch(day=date.min))  # every worker drops its cached reports
         db.session.commit()
         
-        # 2. Reset Auto-Increment Sequence
+        # 2. Reset the counters
+        # Bill numbers (IL00001...) come from the seq_counter table, one row per store.
+        # Restart running workers too, or they finish the block they already reserved.
+        db.session.query(SeqCounter).filter(SeqCounter.name.like('bill:%')).update(
+            {'next_value': 1}, synchronize_session=False)
+
         # Attempt to detect DB type from URI
         db_uri = app.config['SQLALCHEMY_DATABASE_URI']
         
         if 'sqlite' in db_uri:
-            # SQLite Reset
-            db.session.execute(text("DELETE FROM sqlite_sequence WHERE name='bill';"))
-            db.session.execute(text("DELETE FROM sqlite_sequence WHERE name='bill_item';"))
+            # SQLite Reset: sqlite_sequence only exists once a table uses AUTOINCREMENT
+            has_sequence = db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_sequence';")).first()
+            if has_sequence:
+                db.session.execute(text("DELETE FROM sqlite_sequence WHERE name='bill';"))
+                db.session.execute(text("DELETE FROM sqlite_sequence WHERE name='bill_item';"))
         else:
             # PostgreSQL Reset (Neon/Render)
             # Standard naming convention for serial is table_id_seq
             db.session.execute(text("ALTER SEQUENCE bill_id_seq RESTART WITH 1;"))
             db.session.execute(text("ALTER SEQUENCE bill_item_id_seq RESTART WITH 1;"))
-            
+
         db.session.commit()
         
         print(f"✅ Success! Deleted {num_items} items and {num_bills} bills.")
-        print("✅ Counter reset to IL00001.")
+        print("✅ Counters reset to 00001 (IL00001, ...).")
         
     except Exception as e:
         db.session.rollback()
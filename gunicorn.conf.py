@@ -0,0 +1,28 @@
+# Gunicorn settings for the deployment profile (DB_PROFILE, see config.py).
+#   gunicorn app:app          picks this file up automatically
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Imported by name: a module-level `config` would clash with gunicorn's own setting.
+from config import gunicorn_settings, profile_name, worker_count, worker_threads
+
+_profile = profile_name(os.getenv('DATABASE_URL') or 'sqlite:///icecream.db')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+globals().update(gunicorn_settings(_profile))
+
+
+def post_fork(server, worker):
+    # preload_app imports the app in the master; connections must not be shared by the
+    # forked workers, so each worker starts with an empty pool of its own.
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def when_ready(server):
+    server.log.info("DB profile %s: %s gthread workers x %s threads",
+                    _profile, worker_count(_profile), worker_threads(_profile))
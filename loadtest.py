@@ -0,0 +1,357 @@
+"""
+Lunch-rush load test for the POS endpoints.
+
+    python loadtest.py [--users 20] [--duration 30] [--base-url http://host:port]
+                       [--database-url postgresql://...] [--compare loadtest_results/old.json]
+
+Without --base-url it starts the app locally under gunicorn (gunicorn.conf.py) on a
+temporary SQLite database, or on --database-url (e.g. a local Postgres) after
+`flask db-init`. Point it only at a scratch database: it creates and refunds bills.
+
+Cashiers share the sessions of the seeded users (logged in once up front) and loop
+over a POS mix:
+  POST /api/bills      ring up a cart (1-6 lines, popular items much more likely)
+  GET  /api/items      menu refresh (revalidated with If-None-Match, like the browser)
+  GET  /api/bills/last reprint the last receipt
+  refund               an admin refunds one unit of a recent bill line
+                       (POST /admin/bills/<id>/items/<line>/refund)
+
+Reports throughput and p50/p95/p99 latency per endpoint, and writes everything to a
+JSON file (default loadtest_results/<time>-<commit>.json) so runs can be compared with
+--compare. Standard library only.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Seeded users (see seed_data in app.py)
+STAFF_LOGIN = ('amar', 'amar123')
+ADMIN_LOGIN = ('admin', 'Iceland@2025')
+
+# Operation mix: weights per cashier iteration
+MIX = {'create_bill': 55, 'items': 20, 'last_bill': 20, 'refund': 5}
+CART_LINES = {1: 30, 2: 30, 3: 20, 4: 10, 5: 6, 6: 4}
+LINE_QTY = {1: 80, 2: 15, 3: 5}
+ZIPF_S = 1.1  # item popularity skew: the top item sells ~2x the second, ~3.3x the third
+
+
+def weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+class Client:
+    """Cookie-keeping HTTP client for one virtual user."""
+
+    def __init__(self, base_url, cookies=()):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        for cookie in cookies:
+            self.cookies.set_cookie(cookie)
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def request(self, method, path, body=None, headers=None, form=None):
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode()
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=30) as resp:
+                return resp.status, resp.headers, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    def login(self, username, password):
+        """Log in; returns the session cookies so other clients can reuse the session."""
+        status, _, _ = self.request('POST', '/login', form={'username': username, 'password': password})
+        # A successful login redirects to the POS page (followed by urllib)
+        status_check, _, _ = self.request('GET', '/api/items')
+        if status_check != 200:
+            raise RuntimeError(f'login as {username} failed (HTTP {status})')
+        return list(self.cookies)
+
+
+class Recorder:
+    """Latencies and status codes per endpoint, shared by all virtual users."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.recording = False
+
+    def record(self, endpoint, seconds, status, ok):
+        if not self.recording:
+            return
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][str(status)] += 1
+            if not ok:
+                self.errors[endpoint] += 1
+
+
+class Cashier(threading.Thread):
+    def __init__(self, n, args, menu, sessions, recorder, recent_bills, stop):
+        super().__init__(daemon=True)
+        self.rng = random.Random(args.seed + n)
+        self.args = args
+        self.menu = menu
+        self.recorder = recorder
+        self.recent_bills = recent_bills
+        self.stop = stop
+        self.client = Client(args.base_url, sessions['staff'])
+        self.admin = Client(args.base_url, sessions['admin'])
+        self.items_etag = None
+
+    def timed(self, endpoint, fn, ok_statuses=(200,)):
+        t0 = time.perf_counter()
+        try:
+            status, headers, body = fn()
+        except Exception:
+            status, headers, body = 'exception', {}, b''
+        self.recorder.record(endpoint, time.perf_counter() - t0, status, status in ok_statuses)
+        return status, headers, body
+
+    def create_bill(self):
+        ids, weights = self.menu
+        lines = {}
+        for _ in range(weighted(self.rng, CART_LINES)):
+            item_id = self.rng.choices(ids, weights=weights)[0]
+            lines[item_id] = lines.get(item_id, 0) + weighted(self.rng, LINE_QTY)
+        cart = {'customer_name': '', 'items': [{'item_id': i, 'qty': q} for i, q in lines.items()]}
+        status, _, body = self.timed('POST /api/bills', lambda: self.client.request('POST', '/api/bills', body=cart))
+        if status == 200:
+            bill = json.loads(body)
+            with self.recorder.lock:
+                self.recent_bills.append((bill['bill_id'], [line['bill_item_id'] for line in bill['items']]))
+                del self.recent_bills[:-200]
+
+    def items(self):
+        headers = {'If-None-Match': f'"{self.items_etag}"'} if self.items_etag else {}
+        status, resp_headers, _ = self.timed('GET /api/items',
+                                             lambda: self.client.request('GET', '/api/items', headers=headers),
+                                             ok_statuses=(200, 304))
+        if status == 200:
+            self.items_etag = (resp_headers.get('ETag') or '').strip('"') or None
+
+    def last_bill(self):
+        self.timed('GET /api/bills/last', lambda: self.client.request('GET', '/api/bills/last'), ok_statuses=(200, 404))
+
+    def refund(self):
+        with self.recorder.lock:
+            if not self.recent_bills:
+                return
+            bill_id, line_ids = self.rng.choice(self.recent_bills)
+        line_id = self.rng.choice(line_ids)
+        # 400 = line already fully refunded by another cashier: a valid business answer
+        self.timed('refund', lambda: self.admin.request('POST', f'/admin/bills/{bill_id}/items/{line_id}/refund',
+                                                         body={'qty': 1, 'note': 'load test'}),
+                   ok_statuses=(200, 400))
+
+    def run(self):
+        ops = {'create_bill': self.create_bill, 'items': self.items, 'last_bill': self.last_bill, 'refund': self.refund}
+        while not self.stop.is_set():
+            ops[weighted(self.rng, MIX)]()
+            if self.args.think:
+                time.sleep(self.rng.expovariate(1 / self.args.think))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for endpoint, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        endpoints[endpoint] = {
+            'requests': len(values),
+            'errors': recorder.errors[endpoint],
+            'throughput_rps': round(len(values) / elapsed, 2),
+            'mean_ms': round(sum(values) / len(values) * 1000, 2),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2),
+            'statuses': dict(recorder.statuses[endpoint]),
+        }
+    return endpoints
+
+
+def print_table(endpoints, baseline=None):
+    print(f"{'endpoint':<22}{'req':>8}{'err':>6}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for endpoint, r in endpoints.items():
+        print(f"{endpoint:<22}{r['requests']:>8}{r['errors']:>6}{r['throughput_rps']:>9.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}")
+        old = (baseline or {}).get(endpoint)
+        if old:
+            delta = lambda k: (r[k] - old[k]) / old[k] * 100 if old[k] else 0.0
+            print(f"{'  vs baseline':<36}{delta('throughput_rps'):>+8.0f}%{delta('p50_ms'):>+8.0f}%"
+                  f"{delta('p95_ms'):>+8.0f}%{delta('p99_ms'):>+8.0f}%")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def redact(url):
+    password = urllib.parse.urlsplit(url).password
+    return url.replace(f':{password}@', ':***@') if password else url
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_local_server(database_url):
+    """flask db-init + gunicorn on a free port; returns (base_url, process)."""
+    env = dict(os.environ, DATABASE_URL=database_url)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db-init'], cwd=HERE, env=env,
+                   capture_output=True, check=True)
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                             '--bind', f'127.0.0.1:{port}', 'app:app'],
+                            cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base_url + '/login', timeout=1).read()
+            return base_url, proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError('gunicorn exited during startup')
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError('gunicorn did not start in 10s')
+
+
+def log_in(base_url):
+    """
+    One session per seeded user, shared by all cashiers: password hashing makes a login
+    cost far more than a checkout, and it isn't part of the rush being measured.
+    """
+    return {'staff': Client(base_url).login(*STAFF_LOGIN), 'admin': Client(base_url).login(*ADMIN_LOGIN)}
+
+
+def load_menu(base_url, sessions):
+    client = Client(base_url, sessions['staff'])
+    _, _, body = client.request('GET', '/api/items')
+    ids = [item['id'] for item in json.loads(body)]
+    if not ids:
+        raise RuntimeError('the menu is empty')
+    random.Random(0).shuffle(ids)  # popularity independent of id order, same across runs
+    return ids, [1 / (rank + 1) ** ZIPF_S for rank in range(len(ids))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20, help='concurrent cashiers (default 20)')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds (default 30)')
+    parser.add_argument('--warmup', type=float, default=3, help='unmeasured seconds first (default 3)')
+    parser.add_argument('--think', type=float, default=0.05, help='mean pause between actions, seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--base-url', help='test an already running server instead of starting one')
+    parser.add_argument('--database-url', help='database for the local server (default: temporary SQLite)')
+    parser.add_argument('--output', help='results file (default loadtest_results/<time>-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    tmp = server = None
+    if args.base_url:
+        target = args.base_url
+    else:
+        if not args.database_url:
+            tmp = tempfile.TemporaryDirectory()
+            args.database_url = f"sqlite:///{os.path.join(tmp.name, 'loadtest.db')}"
+        args.base_url, server = start_local_server(args.database_url)
+        target = redact(args.database_url)
+
+    try:
+        recorder, recent_bills, stop = Recorder(), [], threading.Event()
+        sessions = log_in(args.base_url)
+        menu = load_menu(args.base_url, sessions)
+        cashiers = [Cashier(n, args, menu, sessions, recorder, recent_bills, stop) for n in range(args.users)]
+        print(f"{args.users} cashiers against {target}: {args.warmup:g}s warm-up, {args.duration:g}s measured")
+        for c in cashiers:
+            c.start()
+        time.sleep(args.warmup)
+        recorder.recording = True
+        started = time.perf_counter()
+        time.sleep(args.duration)
+        recorder.recording = False
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for c in cashiers:
+            c.join(timeout=35)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        if tmp:
+            tmp.cleanup()
+
+    endpoints = summarize(recorder, elapsed)
+    commit = git_commit()
+    result = {
+        'commit': commit,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'target': target,
+        'db_profile': os.getenv('DB_PROFILE') or None,
+        'users': args.users,
+        'duration_s': args.duration,
+        'think_s': args.think,
+        'seed': args.seed,
+        'mix': MIX,
+        'total_rps': round(sum(r['requests'] for r in endpoints.values()) / elapsed, 2),
+        'endpoints': endpoints,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Baseline: {args.compare} (commit {baseline.get('commit')})")
+    print_table(endpoints, baseline and baseline['endpoints'])
+    print(f"total {result['total_rps']:.1f} req/s")
+
+    output = args.output or os.path.join(HERE, 'loadtest_results',
+                                         f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"✅ Results saved to {output}")
+
+    if any(r['errors'] for r in endpoints.values()):
+        print("⚠️  Some requests failed; see 'statuses' in the results file.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -39,10 +39,15 @@ function groupByCategory(items) {
   return groups;
 }
 
+// Menu buttons are built once per load of ITEMS; one delegated listener handles taps
+// and the quick search only toggles `hidden`, so nothing is re-rendered while selling.
+let ITEM_BY_ID = {};
+
 function renderMenu() {
   const container = document.getElementById('menu-container');
   if (!container) return;
-  container.innerHTML = '';
+  ITEM_BY_ID = {};
+  const fragment = document.createDocumentFragment();
   const groups = groupByCategory(ITEMS);
   Object.keys(groups).forEach(cat => {
     const section = document.createElement('div');
@@ -56,21 +61,68 @@ function renderMenu() {
     row.className = 'menu-items';
 
     groups[cat].forEach(item => {
+      ITEM_BY_ID[item.id] = item;
       const btn = document.createElement('button');
+      btn.type = 'button';
       btn.className = 'menu-item-btn';
-      btn.innerHTML = `
-        <span class="menu-item-name">${item.name}</span>
-        <span class="menu-item-price">${item.code} • ₹${item.price.toFixed(2)}</span>
-      `;
-      btn.addEventListener('click', () => addToCart(item));
+      btn.dataset.itemId = item.id;
+      btn.dataset.search = `${item.code} ${item.name}`.toLowerCase();
+
+      const name = document.createElement('span');
+      name.className = 'menu-item-name';
+      name.textContent = item.name;
+      const price = document.createElement('span');
+      price.className = 'menu-item-price';
+      price.textContent = `${item.code} • ₹${item.price.toFixed(2)}`;
+      btn.append(name, price);
       row.appendChild(btn);
     });
 
     section.appendChild(row);
-    container.appendChild(section);
+    fragment.appendChild(section);
+  });
+  container.replaceChildren(fragment);
+  filterMenu();
+}
+
+function onMenuClick(event) {
+  const btn = event.target.closest('.menu-item-btn');
+  if (btn) addToCart(ITEM_BY_ID[btn.dataset.itemId]);
+}
+
+function filterMenu() {
+  const input = document.getElementById('menu-search');
+  const query = input ? input.value.trim().toLowerCase() : '';
+  document.querySelectorAll('#menu-container .menu-category').forEach(section => {
+    let visible = 0;
+    section.querySelectorAll('.menu-item-btn').forEach(btn => {
+      const match = !query || btn.dataset.search.includes(query);
+      if (btn.hidden === match) btn.hidden = !match;
+      if (match) visible += 1;
+    });
+    if (section.hidden === (visible > 0)) section.hidden = visible === 0;
   });
 }
 
+/* Enter in the search box adds the item whose code was typed, or the only match */
+function onMenuSearchKey(event) {
+  if (event.key !== 'Enter') return;
+  event.preventDefault();
+  const input = event.target;
+  const query = input.value.trim().toLowerCase();
+  if (!query) return;
+
+  let item = ITEMS.find(it => String(it.code).toLowerCase() === query);
+  if (!item) {
+    const matches = document.querySelectorAll('#menu-container .menu-item-btn:not([hidden])');
+    if (matches.length === 1) item = ITEM_BY_ID[matches[0].dataset.itemId];
+  }
+  if (!item) return;
+  addToCart(item);
+  input.value = '';
+  filterMenu();
+}
+
 function addToCart(item) {
   if (!CART[item.id]) {
     CART[item.id] = {
@@ -82,7 +134,7 @@ function addToCart(item) {
     };
   }
   CART[item.id].qty += 1;
-  renderCart();
+  updateCartRow(item.id);
 }
 
 function changeQty(itemId, delta) {
@@ -92,7 +144,7 @@ function changeQty(itemId, delta) {
   if (row.qty <= 0) {
     delete CART[itemId];
   }
-  renderCart();
+  updateCartRow(itemId);
 }
 
 function clearCart() {
@@ -100,39 +152,78 @@ function clearCart() {
   renderCart();
 }
 
-function renderCart() {
-  const tbody = document.querySelector('#cart-table tbody');
-  const totalSpan = document.getElementById('cart-total-amount');
-  if (!tbody || !totalSpan) return;
+// Cart table rows keyed by item id: {tr, qty, total} elements
+let CART_ROWS = {};
 
-  tbody.innerHTML = '';
-  let total = 0;
-
-  Object.values(CART).forEach(row => {
-    const tr = document.createElement('tr');
-    const lineTotal = row.qty * row.price;
-    total += lineTotal;
-
-    tr.innerHTML = `
-      <td>${row.code}</td>
-      <td>${row.name}</td>
+function createCartRow(row) {
+  const tr = document.createElement('tr');
+  tr.dataset.itemId = row.id;
+  tr.innerHTML = `
+      <td></td>
+      <td></td>
       <td>
-        <button type="button" onclick="changeQty(${row.id}, -1)">-</button>
-        ${row.qty}
-        <button type="button" onclick="changeQty(${row.id}, 1)">+</button>
+        <button type="button" data-action="dec">-</button>
+        <span class="cart-qty"></span>
+        <button type="button" data-action="inc">+</button>
       </td>
-      <td>₹${lineTotal.toFixed(2)}</td>
-      <td><button type="button" onclick="removeItem(${row.id})">x</button></td>
+      <td class="cart-line-total"></td>
+      <td><button type="button" data-action="remove">x</button></td>
     `;
-    tbody.appendChild(tr);
-  });
+  tr.cells[0].textContent = row.code;
+  tr.cells[1].textContent = row.name;
+  return { tr, qty: tr.querySelector('.cart-qty'), total: tr.querySelector('.cart-line-total') };
+}
 
+/* Bring one item's row (and the total) in line with CART, touching nothing else */
+function updateCartRow(itemId) {
+  const tbody = document.querySelector('#cart-table tbody');
+  if (!tbody) return;
+  const row = CART[itemId];
+  let view = CART_ROWS[itemId];
+
+  if (!row) {
+    if (view) view.tr.remove();
+    delete CART_ROWS[itemId];
+  } else {
+    if (!view) {
+      view = CART_ROWS[itemId] = createCartRow(row);
+      tbody.appendChild(view.tr);
+    }
+    view.qty.textContent = row.qty;
+    view.total.textContent = `₹${(row.qty * row.price).toFixed(2)}`;
+  }
+  updateCartTotal();
+}
+
+function updateCartTotal() {
+  const totalSpan = document.getElementById('cart-total-amount');
+  if (!totalSpan) return;
+  const total = Object.values(CART).reduce((sum, row) => sum + row.qty * row.price, 0);
   totalSpan.textContent = total.toFixed(2);
 }
 
+/* Full rebuild, only when the whole cart changes at once (cleared after checkout) */
+function renderCart() {
+  const tbody = document.querySelector('#cart-table tbody');
+  if (!tbody) return;
+  tbody.replaceChildren();
+  CART_ROWS = {};
+  Object.keys(CART).forEach(updateCartRow);
+  updateCartTotal();
+}
+
+function onCartClick(event) {
+  const btn = event.target.closest('button[data-action]');
+  if (!btn) return;
+  const itemId = btn.closest('tr').dataset.itemId;
+  if (btn.dataset.action === 'inc') changeQty(itemId, 1);
+  else if (btn.dataset.action === 'dec') changeQty(itemId, -1);
+  else removeItem(itemId);
+}
+
 function removeItem(itemId) {
   delete CART[itemId];
-  renderCart();
+  updateCartRow(itemId);
 }
 
 
@@ -383,10 +474,21 @@ async function reprintByCode() {
 }
 
 document.addEventListener('DOMContentLoaded', () => {
-  if (document.getElementById('menu-container')) {
+  const menuContainer = document.getElementById('menu-container');
+  if (menuContainer) {
+    menuContainer.addEventListener('click', onMenuClick);
     loadItems();
   }
 
+  const menuSearch = document.getElementById('menu-search');
+  if (menuSearch) {
+    menuSearch.addEventListener('input', filterMenu);
+    menuSearch.addEventListener('keydown', onMenuSearchKey);
+  }
+
+  const cartBody = document.querySelector('#cart-table tbody');
+  if (cartBody) cartBody.addEventListener('click', onCartClick);
+
   const clearBtn = document.getElementById('clear-cart');
   if (clearBtn) clearBtn.addEventListener('click', clearCart);
 
@@ -0,0 +1,152 @@
+"""
+Concurrent refund / status-change stress test.
+
+    python stress_refunds.py [--threads 8] [--bills 3] [--qty 40]
+
+Creates --bills bills, each with two lines of --qty units. Then --threads admins hammer
+them at once: most refund one unit of a random line until it is fully refunded, and one
+flips the bills between ACTIVE and CANCELLED meanwhile. Afterwards every line must be
+refunded exactly --qty times (no lost update, no over-refund), every bill total must equal
+its lines minus the successful refunds, and the daily rollup must match the bills.
+
+Runs on a temporary SQLite database, or on DATABASE_URL (Postgres) if set; that database
+gets the bills, so use a scratch one. Exits 1 on any inconsistency.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--threads', type=int, default=8)
+parser.add_argument('--bills', type=int, default=3)
+parser.add_argument('--qty', type=int, default=40, help='units per bill line')
+args = parser.parse_args()
+
+tmp = None
+if not os.getenv('DATABASE_URL'):
+    tmp = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp.name, 'stress.db')}"
+
+from app import app, db, init_db, Bill, BillItem, DailySales  # noqa: E402  (DATABASE_URL must be set first)
+
+
+def admin_client():
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'Iceland@2025'})
+    return client
+
+
+def main():
+    with app.app_context():
+        init_db()
+
+    setup = admin_client()
+    bills = []
+    for _ in range(args.bills):
+        bill = setup.post('/api/bills', json={'items': [{'item_id': 1, 'qty': args.qty},
+                                                        {'item_id': 2, 'qty': args.qty}]}).get_json()
+        bills.append(bill)
+    lines = [(b['bill_id'], line['bill_item_id'], line['price']) for b in bills for line in b['items']]
+
+    # One session shared by all threads: logging in is slow and not what is being tested
+    cookie = setup.get_cookie('session')
+    lock = threading.Lock()
+    refunded = {line_id: 0 for _, line_id, _ in lines}
+    refund_value = {b['bill_id']: 0.0 for b in bills}
+    latencies, errors = [], []
+    done = threading.Event()
+
+    def client():
+        c = app.test_client()
+        c.set_cookie('session', cookie.value)
+        return c
+
+    def refunder(seed):
+        rng = random.Random(seed)
+        c = client()
+        open_lines = list(lines)
+        while open_lines:
+            bill_id, line_id, price = rng.choice(open_lines)
+            t0 = time.perf_counter()
+            resp = c.post(f'/admin/bills/{bill_id}/items/{line_id}/refund', json={'qty': 1})
+            elapsed = time.perf_counter() - t0
+            if resp.status_code == 200:
+                with lock:
+                    refunded[line_id] += 1
+                    refund_value[bill_id] += price
+                    latencies.append(elapsed)
+            elif resp.status_code == 400:
+                open_lines.remove((bill_id, line_id, price))  # fully refunded
+            else:
+                with lock:
+                    errors.append(f'refund {line_id}: HTTP {resp.status_code}')
+
+    def status_flipper(seed):
+        rng = random.Random(seed)
+        c = client()
+        while not done.is_set():
+            bill_id = rng.choice(bills)['bill_id']
+            status = rng.choice(['ACTIVE', 'CANCELLED'])
+            resp = c.post(f'/admin/bills/{bill_id}/status', json={'status': status})
+            if resp.status_code != 200:
+                with lock:
+                    errors.append(f'status {bill_id}: HTTP {resp.status_code}')
+
+    refunders = [threading.Thread(target=refunder, args=(n,)) for n in range(max(args.threads - 1, 1))]
+    flipper = threading.Thread(target=status_flipper, args=(-1,))
+    started = time.perf_counter()
+    flipper.start()
+    for t in refunders:
+        t.start()
+    for t in refunders:
+        t.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    flipper.join()
+
+    failures = list(errors)
+    with app.app_context():
+        for bill in bills:
+            row = db.session.get(Bill, bill['bill_id'])
+            expected_total = bill['total_amount'] - refund_value[bill['bill_id']]
+            if abs(row.total_amount - expected_total) > 1e-6:
+                failures.append(f"bill {row.id}: total {row.total_amount}, expected {expected_total}")
+        for bill_id, line_id, _ in lines:
+            bi = db.session.get(BillItem, line_id)
+            if bi.refunded_qty != args.qty or refunded[line_id] != args.qty:
+                failures.append(f"line {line_id}: refunded_qty {bi.refunded_qty}, "
+                                f"{refunded[line_id]} successful refunds, quantity {args.qty}")
+
+        # The rollup must equal the ACTIVE bills (everything in this run is from one day)
+        first = db.session.get(Bill, bills[0]['bill_id'])
+        day = first.created_at.date()
+        active = Bill.query.filter(Bill.status == 'ACTIVE', Bill.store_id == first.store_id,
+                                   db.func.date(Bill.created_at) == str(day)).all()
+        rollup = db.session.get(DailySales, (first.store_id, day))
+        if rollup.bill_count != len(active) or abs(rollup.revenue - sum(b.total_amount for b in active)) > 1e-6:
+            failures.append(f"rollup {day}: {rollup.bill_count} bills / {rollup.revenue}, "
+                            f"bills say {len(active)} / {sum(b.total_amount for b in active)}")
+
+    latencies.sort()
+    n = len(latencies)
+    print(f"Target Database: {app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"{n} refunds by {len(refunders)} threads (+1 flipping status) in {elapsed:.2f}s: "
+          f"{n / elapsed:.0f} refunds/s, p50 {latencies[n // 2] * 1000:.1f} ms, "
+          f"p99 {latencies[min(n - 1, int(n * 0.99))] * 1000:.1f} ms")
+    if failures:
+        for f in failures:
+            print(f"❌ {f}")
+        return 1
+    print("✅ No lost updates: every line refunded exactly once per unit, totals and rollups consistent.")
+    return 0
+
+
+if __name__ == "__main__":
+    code = main()
+    if tmp:
+        tmp.cleanup()
+    sys.exit(code)
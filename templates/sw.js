@@ -0,0 +1,80 @@
+// POS service worker, rendered by app.py and served at /sw.js.
+//
+// Fingerprinted static files (and the pinned Chart.js) never change: cache first.
+// The POS page and the menu go to the network, but fall back to the last good copy when
+// it fails or takes longer than NETWORK_TIMEOUT_MS, so the till still opens during a
+// Wi-Fi blip. Anything that isn't a GET (checkout, refunds) is left alone.
+
+const ASSET_CACHE = 'pos-assets-{{ version }}';
+const SHELL_CACHE = 'pos-shell';
+const PRECACHE = {{ precache|tojson }};
+const IMMUTABLE_PREFIX = {{ immutable_prefix|tojson }};
+const IMMUTABLE_URLS = {{ immutable_urls|tojson }};
+const SHELL = {{ shell|tojson }};
+const SIGN_OUT = {{ sign_out|tojson }};
+const NETWORK_TIMEOUT_MS = 2500;
+
+self.addEventListener('install', event => {
+  event.waitUntil(
+    caches.open(ASSET_CACHE)
+      .then(cache => cache.addAll(PRECACHE))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', event => {
+  // Assets of older builds are never requested again
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(keys
+        .filter(key => key.startsWith('pos-assets-') && key !== ASSET_CACHE)
+        .map(key => caches.delete(key))))
+      .then(() => self.clients.claim())
+  );
+});
+
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  if (request.method !== 'GET') return;
+  const url = new URL(request.url);
+  const local = url.origin === self.location.origin;
+
+  if (local && SIGN_OUT.includes(url.pathname)) {
+    // The next user must not get this user's page or menu from the cache
+    event.waitUntil(caches.delete(SHELL_CACHE));
+  } else if ((local && url.pathname.startsWith(IMMUTABLE_PREFIX)) || IMMUTABLE_URLS.includes(request.url)) {
+    event.respondWith(cacheFirst(request));
+  } else if (local && SHELL.includes(url.pathname)) {
+    event.respondWith(networkFirst(request));
+  }
+});
+
+async function cacheFirst(request) {
+  const cache = await caches.open(ASSET_CACHE);
+  const cached = await cache.match(request);
+  if (cached) return cached;
+
+  const response = await fetch(request);
+  if (response.ok) cache.put(request, response.clone());
+  return response;
+}
+
+async function networkFirst(request) {
+  const cache = await caches.open(SHELL_CACHE);
+  const network = fetch(request).then(response => {
+    // Redirects mean "log in again": keep the last good copy instead
+    if (response.ok && response.type === 'basic' && !response.redirected) {
+      cache.put(request, response.clone());
+    }
+    return response;
+  });
+  const timeout = new Promise(resolve => setTimeout(resolve, NETWORK_TIMEOUT_MS));
+
+  try {
+    const response = await Promise.race([network, timeout]);
+    if (response) return response;
+  } catch (e) {
+    // offline: fall through to the cached copy
+  }
+  return (await cache.match(request, { ignoreVary: true })) || network;
+}